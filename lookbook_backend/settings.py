@@ -110,6 +110,27 @@ else:
     }
 
 
+# Cache configuration
+# "shared" is a database-backed cache visible to every worker process; run
+# `python manage.py createcachetable` once after migrating.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.getenv("LOCAL_CACHE_MAX_ENTRIES", "1000")),
+        },
+    },
+    "shared": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "lookbook_cache",
+        "TIMEOUT": None,
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.getenv("SHARED_CACHE_MAX_ENTRIES", "50000")),
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -153,6 +174,21 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Uploads are stored under content-hashed names so their URLs never go stale.
+# STORAGES needs Django 4.2+ (see requirements.txt); older versions ignore it.
+STORAGES = {
+    "default": {"BACKEND": "styles.storage.HashedFileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+# How MEDIA_URL is served: "django" streams files with Range, ETag and
+# Last-Modified support; "x-accel" (nginx) and "x-sendfile" (Apache, lighttpd)
+# hand them to the front server; "none" leaves /media/ to the front server
+# entirely. X-Accel-Redirect points at MEDIA_INTERNAL_URL, an internal nginx
+# location aliased to MEDIA_ROOT.
+MEDIA_SERVE_MODE = os.getenv("MEDIA_SERVE_MODE", "django" if DEBUG else "none")
+MEDIA_INTERNAL_URL = os.getenv("MEDIA_INTERNAL_URL", "/protected-media/")
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -185,13 +221,81 @@ cors_origins_env = os.getenv(
 )
 CORS_ALLOWED_ORIGINS = [origin.strip() for origin in cors_origins_env.split(",")]
 CORS_ALLOW_CREDENTIALS = True
+CORS_EXPOSE_HEADERS = ["X-Cache"]
 
 # External service configuration
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# Vector backend: "pinecone" or "local" (memory-mapped NumPy index on disk)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")
+VECTOR_LOCAL_PATH = os.getenv("VECTOR_LOCAL_PATH", str(BASE_DIR / "vector_index"))
+# Storage type for new local indexes: "float32", or "int8" for a quarter of the memory
+VECTOR_LOCAL_DTYPE = os.getenv("VECTOR_LOCAL_DTYPE", "float32")
+
+# Minimum cosine similarity for a vector match to be returned
+VECTOR_SEARCH_MIN_SCORE = float(os.getenv("VECTOR_SEARCH_MIN_SCORE", "0.75"))
+
+# Client connection pools, shared by all threads of a worker process
+VECTOR_SEARCH_POOL_SIZE = int(os.getenv("VECTOR_SEARCH_POOL_SIZE", "10"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "20"))  # seconds
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60"))  # seconds
+PINECONE_TIMEOUT = float(os.getenv("PINECONE_TIMEOUT", "10"))  # seconds
+
+# Embeddings
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+# Shortened output size (e.g. 256 or 512); empty uses the model's full size.
+# Changing it needs a new index: see `manage.py reembed_styles`
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS") or 0) or None
+EMBEDDING_CACHE_ALIAS = "shared"
+EMBEDDING_CACHE_LOCAL_SIZE = int(os.getenv("EMBEDDING_CACHE_LOCAL_SIZE", "2048"))
+EMBEDDING_CACHE_TIMEOUT = int(os.getenv("EMBEDDING_CACHE_TIMEOUT", str(60 * 60 * 24 * 30)))  # 30 days
+# Precision of the per-style embeddings kept in the database: "float16" or "float32"
+EMBEDDING_STORE_DTYPE = os.getenv("EMBEDDING_STORE_DTYPE", "float16")
+
+# Search response cache, invalidated by the catalog version in the shared cache
+CATALOG_CACHE_ALIAS = "shared"
+SEARCH_CACHE_ALIAS = "default"
+SEARCH_CACHE_TIMEOUT = int(os.getenv("SEARCH_CACHE_TIMEOUT", "600"))  # seconds
+FACETS_CACHE_TIMEOUT = int(os.getenv("FACETS_CACHE_TIMEOUT", "3600"))  # seconds
+# Per-style serialized fragments, keyed by updated_at so they never need deleting
+FRAGMENT_CACHE_ALIAS = "default"
+FRAGMENT_CACHE_TIMEOUT = int(os.getenv("FRAGMENT_CACHE_TIMEOUT", str(60 * 60 * 24)))  # seconds
+
+# Precomputed neighbors per style for /api/styles/{id}/similar/
+SIMILAR_STYLES_COUNT = int(os.getenv("SIMILAR_STYLES_COUNT", "12"))
+
+# Full-text index for the lexical fallback: "auto" (FTS5 on SQLite, FULLTEXT
+# on MySQL, otherwise the in-process index), "fts5", "mysql" or "python"
+LEXICAL_SEARCH_BACKEND = os.getenv("LEXICAL_SEARCH_BACKEND", "auto")
+
+# Per-stage deadlines (seconds) for the async search endpoint
+SEARCH_DEADLINES = {
+    "embedding": float(os.getenv("SEARCH_EMBEDDING_DEADLINE", "3")),
+    "vector": float(os.getenv("SEARCH_VECTOR_DEADLINE", "2")),
+    "lexical": float(os.getenv("SEARCH_LEXICAL_DEADLINE", "2")),
+    "ai": float(os.getenv("SEARCH_AI_DEADLINE", "10")),
+}
+
+# Resized WebP/JPEG copies of each uploaded image, rendered in a process pool
+# after the upload commits (or by `python manage.py generate_derivatives`)
+IMAGE_DERIVATIVES_ON_UPLOAD = os.getenv("IMAGE_DERIVATIVES_ON_UPLOAD", "True").lower() == "true"
+IMAGE_DERIVATIVE_WIDTHS = [int(width) for width in os.getenv("IMAGE_DERIVATIVE_WIDTHS", "320,640,1024,1600").split(",")]
+IMAGE_DERIVATIVE_FORMATS = ["webp", "jpeg"]
+IMAGE_DERIVATIVE_QUALITY = int(os.getenv("IMAGE_DERIVATIVE_QUALITY", "80"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
 # File upload settings
-FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
+# Uploads are checked as they stream in (type, size, dimensions) and requests
+# over FILE_UPLOAD_MAX_MEMORY_SIZE are spooled to a temporary file on disk
+FILE_UPLOAD_HANDLERS = [
+    "styles.uploads.ImageUploadHandler",
+    "django.core.files.uploadhandler.MemoryFileUploadHandler",
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+]
+IMAGE_UPLOAD_MAX_PIXELS = int(os.getenv("IMAGE_UPLOAD_MAX_PIXELS", str(50_000_000)))
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(2.5 * 1024 * 1024)  # 2.5MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 
 TAGGIT_CASE_INSENSITIVE = True
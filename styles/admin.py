@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Style, Image
+from .models import Style, Image, IndexOperation
 
 
 class ImageAdmin(admin.TabularInline):
@@ -15,3 +15,11 @@ class StyleAdmin(admin.ModelAdmin):
 
 
 admin.site.register(Style, StyleAdmin)
+
+
+class IndexOperationAdmin(admin.ModelAdmin):
+    list_display = ["style_id", "action", "status", "attempts", "available_at", "created_at"]
+    list_filter = ["status", "action"]
+
+
+admin.site.register(IndexOperation, IndexOperationAdmin)
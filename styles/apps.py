@@ -6,9 +6,5 @@ class StylesConfig(AppConfig):
     name = 'styles'
 
     def ready(self):
-        from django.db.models.signals import post_save, post_delete
+        # Receivers are connected by the @receiver decorators on import
         from . import signals
-        from .models import Style
-
-        post_save.connect(signals.styles_changed, sender=Style)
-        post_delete.connect(signals.styles_deleted, sender=Style)
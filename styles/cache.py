@@ -0,0 +1,225 @@
+import hashlib
+import json
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def normalize_text(text):
+    """Collapse whitespace and apply NFC so equivalent strings share a cache key"""
+    return unicodedata.normalize("NFC", " ".join((text or "").split()))
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache for embedding vectors keyed by (model, normalized text hash).
+
+    The first tier is a bounded in-process LRU; the second is a Django cache
+    backend shared by every worker, which owns TTL and eviction. Vectors are
+    stored in the shared tier as packed float32 bytes to keep rows small.
+    """
+
+    key_prefix = "embedding"
+
+    def __init__(self, alias=None, max_entries=None, timeout=None):
+        self.alias = alias or settings.EMBEDDING_CACHE_ALIAS
+        self.max_entries = max_entries or settings.EMBEDDING_CACHE_LOCAL_SIZE
+        self.timeout = timeout if timeout is not None else settings.EMBEDDING_CACHE_TIMEOUT
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def make_key(self, model, text):
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{self.key_prefix}:{model}:{digest}"
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def _put_local(self, key, vector):
+        # Caller holds self._lock
+        self._local[key] = vector
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    def _remember(self, key, vector):
+        with self._lock:
+            self._put_local(key, vector)
+
+    def get(self, model, text):
+        """Return the cached vector for text, or None"""
+        return self.get_many(model, [text]).get(text)
+
+    def get_many(self, model, texts):
+        """Return a dict of text -> vector for every text found in either tier"""
+        keys = {self.make_key(model, text): text for text in texts}
+        found = {}
+        missing = []
+
+        with self._lock:
+            for key, text in keys.items():
+                vector = self._local.get(key)
+                if vector is None:
+                    missing.append(key)
+                    continue
+                self._local.move_to_end(key)
+                found[text] = vector
+                self.local_hits += 1
+
+        if missing:
+            try:
+                packed = self.shared.get_many(missing)
+            except Exception as e:
+                print(f"Error reading embedding cache: {e}")
+                packed = {}
+
+            vectors = {key: array("f", packed[key]).tolist() for key in missing if key in packed}
+            # Counters are shared by every request thread, so update them under the lock
+            with self._lock:
+                for key, vector in vectors.items():
+                    self._put_local(key, vector)
+                    found[keys[key]] = vector
+                self.shared_hits += len(vectors)
+                self.misses += len(missing) - len(vectors)
+
+        return found
+
+    def set(self, model, text, vector):
+        self.set_many(model, {text: vector})
+
+    def set_many(self, model, vectors):
+        """Store a dict of text -> vector in both tiers"""
+        packed = {}
+        for text, vector in vectors.items():
+            key = self.make_key(model, text)
+            self._remember(key, list(vector))
+            packed[key] = array("f", vector).tobytes()
+
+        try:
+            self.shared.set_many(packed, timeout=self.timeout)
+        except Exception as e:
+            print(f"Error writing embedding cache: {e}")
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def stats(self):
+        with self._lock:
+            local_hits, shared_hits, misses = self.local_hits, self.shared_hits, self.misses
+            local_size = len(self._local)
+        lookups = local_hits + shared_hits + misses
+        return {
+            "local_hits": local_hits,
+            "shared_hits": shared_hits,
+            "misses": misses,
+            "hit_rate": (local_hits + shared_hits) / lookups if lookups else 0.0,
+            "local_size": local_size,
+        }
+
+    def summary(self):
+        """One-line description of stats(), for command output"""
+        stats = self.stats()
+        return (
+            f"Embedding cache: {stats['local_hits']} local hits, {stats['shared_hits']} shared hits, "
+            f"{stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)"
+        )
+
+
+embedding_cache = EmbeddingCache()
+
+
+CATALOG_VERSION_KEY = "catalog:version"
+
+
+def get_catalog_version():
+    """
+    Token that changes whenever a Style, Image or tag changes. Missing keys are
+    seeded from the clock so an evicted counter never reuses an old version.
+    Returns None if the shared cache is unavailable.
+    """
+    shared = caches[settings.CATALOG_CACHE_ALIAS]
+    try:
+        version = shared.get(CATALOG_VERSION_KEY)
+        if version is None:
+            shared.add(CATALOG_VERSION_KEY, time.time_ns() // 1000, timeout=None)
+            version = shared.get(CATALOG_VERSION_KEY)
+        return version
+    except Exception as e:
+        print(f"Error reading catalog version: {e}")
+        return None
+
+
+def bump_catalog_version():
+    shared = caches[settings.CATALOG_CACHE_ALIAS]
+    try:
+        shared.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        shared.add(CATALOG_VERSION_KEY, time.time_ns() // 1000, timeout=None)
+    except Exception as e:
+        print(f"Error bumping catalog version: {e}")
+
+
+def catalog_cache_key(prefix, text):
+    """Key scoped to the current catalog version, or None when caching is unavailable"""
+    version = get_catalog_version()
+    if version is None:
+        return None
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return f"{prefix}:{version}:{digest}"
+
+
+# Part of every catalog ETag; bump when the API's response format changes
+ETAG_FORMAT_VERSION = 1
+
+
+def catalog_etag(*parts):
+    """
+    Strong ETag for a response determined by the catalog and the given request
+    parts (e.g. host and full path), or None when the catalog version is unavailable
+    """
+    version = get_catalog_version()
+    if version is None:
+        return None
+    text = json.dumps([ETAG_FORMAT_VERSION, version, *parts])
+    return f'"{hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]}"'
+
+
+def search_cache_key(query, base_url):
+    """
+    Key for a cached search response, or None when caching is unavailable.
+    base_url is part of the key because photo URLs in the payload are absolute.
+    """
+    return catalog_cache_key("search", f"{base_url}|{normalize_text(query).casefold()}")
+
+
+def get_cached_search(key):
+    return caches[settings.SEARCH_CACHE_ALIAS].get(key) if key else None
+
+
+def cache_search(key, payload):
+    if key:
+        caches[settings.SEARCH_CACHE_ALIAS].set(key, payload, timeout=settings.SEARCH_CACHE_TIMEOUT)
+
+
+def facets_cache_key(filters):
+    normalized = {field: sorted(value) if isinstance(value, list) else value for field, value in filters.items()}
+    return catalog_cache_key("facets", json.dumps(normalized, sort_keys=True))
+
+
+def get_cached_facets(key):
+    return caches[settings.SEARCH_CACHE_ALIAS].get(key) if key else None
+
+
+def cache_facets(key, payload):
+    if key:
+        caches[settings.SEARCH_CACHE_ALIAS].set(key, payload, timeout=settings.FACETS_CACHE_TIMEOUT)
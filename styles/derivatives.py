@@ -0,0 +1,203 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+
+from .imaging import analyze_bytes, render_derivatives
+from .indexing import bulk_indexing, style_touched
+from .models import Image
+
+
+DERIVATIVES_DIR = "styles/derivatives/"
+EXTENSIONS = {"webp": ".webp", "jpeg": ".jpg"}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Threads that store finished uploads, so requests never wait on the process pool
+_store_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="image-store")
+
+
+def get_executor():
+    """Process pool shared by uploads in this worker, created on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn rather than fork: the web process has threads of its own
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        _executor = None
+
+
+def derivative_name(name, width, fmt):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return f"{DERIVATIVES_DIR}{stem}-{width}w{EXTENSIONS[fmt]}"
+
+
+def delete_derivatives(derivatives):
+    """Remove the stored files of an Image.derivatives map"""
+    for sizes in derivatives.values():
+        for name in sizes.values():
+            try:
+                default_storage.delete(name)
+            except OSError as e:
+                print(f"Error deleting derivative {name}: {e}")
+
+
+def is_shared(name, image_id):
+    """Whether an Image other than image_id uses the original name, and so its derivatives"""
+    return Image.objects.filter(image=name).exclude(pk=image_id).exists()
+
+
+def _store(image, rendered, source=None):
+    """
+    Save rendered derivatives, replacing the image's earlier set; source is
+    the original that set was rendered from, if it is no longer image.image.
+    """
+    # Identical uploads share one hashed original and its derivatives
+    if not is_shared(source or image.image.name, image.pk):
+        delete_derivatives(image.derivatives)
+    return {
+        fmt: {
+            str(width): default_storage.save(derivative_name(image.image.name, width, fmt), ContentFile(data))
+            for width, data in sizes.items()
+        }
+        for fmt, sizes in rendered.items()
+    }
+
+
+def _save_derivatives(image, rendered, source=None):
+    image.derivatives = _store(image, rendered, source)
+    Image.objects.filter(pk=image.pk).update(derivatives=image.derivatives)
+    # Cached style fragments embed the srcset
+    style_touched(image.style_id)
+
+
+def _derivative_options():
+    return settings.IMAGE_DERIVATIVE_WIDTHS, settings.IMAGE_DERIVATIVE_FORMATS, settings.IMAGE_DERIVATIVE_QUALITY
+
+
+def _submit(images, func, *args):
+    """Yield (image, future) for func(image bytes, *args) in the process pool"""
+    executor = get_executor()
+    for image in images:
+        try:
+            with image.image.open("rb") as f:
+                data = f.read()
+        except (OSError, ValueError) as e:
+            print(f"Error reading image {image.id}: {e}")
+            continue
+        yield image, executor.submit(func, data, *args)
+
+
+def generate_derivatives(images):
+    """
+    Render resized derivatives of each image's original in the process pool,
+    store them next to the originals and record them on Image.derivatives,
+    replacing any earlier set. Returns the number of images updated.
+    """
+    try:
+        futures = list(_submit(images, render_derivatives, *_derivative_options()))
+        updated = 0
+        with bulk_indexing():
+            for image, future in futures:
+                try:
+                    _save_derivatives(image, future.result())
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    print(f"Error generating derivatives for image {image.id}: {e}")
+                    continue
+                updated += 1
+        return updated
+    except BrokenProcessPool as e:
+        # A worker died (e.g. out of memory); start a fresh pool next time
+        print(f"Image worker pool failed: {e}")
+        _reset_executor()
+        return 0
+
+
+def analyze_images(images):
+    """
+    Compute the preview fields (dimensions, dominant color, placeholder) of
+    each image in the process pool and save them. Returns the number updated.
+    """
+    try:
+        futures = list(_submit(images, analyze_bytes))
+        analyzed = []
+        for image, future in futures:
+            try:
+                preview = future.result()
+            except BrokenProcessPool:
+                raise
+            except Exception as e:
+                print(f"Error analyzing image {image.id}: {e}")
+                continue
+            for field, value in preview.items():
+                setattr(image, field, value)
+            analyzed.append(image)
+    except BrokenProcessPool as e:
+        print(f"Image worker pool failed: {e}")
+        _reset_executor()
+        return 0
+
+    with bulk_indexing():
+        Image.objects.bulk_update(analyzed, Image.PREVIEW_FIELDS)
+        # bulk_update sends no signals; cached style fragments embed the preview
+        for image in analyzed:
+            style_touched(image.style_id)
+    return len(analyzed)
+
+
+def image_uploaded(image_id, previous_name=None):
+    """
+    Generate derivatives for an image once the current transaction commits;
+    previous_name is the original its current derivatives were rendered from.
+    """
+    # One callback per image: nothing waits on the pool, so an admin save
+    # with many inlines still renders them in parallel
+    transaction.on_commit(partial(process_uploads, {image_id: previous_name}))
+
+
+def process_uploads(previous_names):
+    """
+    Send the originals of the given images ({id: previous original name}) to
+    the process pool and return without waiting; each result is stored by an
+    image-store thread.
+    """
+    images = Image.objects.filter(id__in=previous_names).exclude(image="")
+    try:
+        for image, future in _submit(images, render_derivatives, *_derivative_options()):
+            future.add_done_callback(
+                partial(_store_executor.submit, _store_upload, image, previous_names[image.id])
+            )
+    except BrokenProcessPool as e:
+        print(f"Image worker pool failed: {e}")
+        _reset_executor()
+
+
+def _store_upload(image, previous_name, future):
+    try:
+        _save_derivatives(image, future.result(), previous_name)
+    except BrokenProcessPool as e:
+        print(f"Image worker pool failed: {e}")
+        _reset_executor()
+    except Exception as e:
+        print(f"Error generating derivatives for image {image.id}: {e}")
+    finally:
+        # Pool threads outlive requests; release their database connection like a request would
+        close_old_connections()
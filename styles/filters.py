@@ -0,0 +1,119 @@
+from django.db.models import Count, Q, Value
+from django.db.models.functions import Lower
+from django.db.models.lookups import Exact
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import FACE_SHAPE, GENDER, HAIR_LENGTH, HAIR_TEXTURE, HAIR_THICKNESS, MAINTENANCE_CHOICES, Style
+
+
+"""
+Filterable Style choice fields and their choices
+"""
+CHOICES = {
+    "face_shape": FACE_SHAPE,
+    "gender": GENDER,
+    "length": HAIR_LENGTH,
+    "texture": HAIR_TEXTURE,
+    "thickness": HAIR_THICKNESS,
+    "maintenance": MAINTENANCE_CHOICES,
+}
+
+# Most frequent tags returned by facet_counts
+FACET_TAG_LIMIT = 50
+
+
+def _split(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def parse_filters(params):
+    """
+    Filters from query params, e.g. ?length=short,medium&tags=blonde&stylist=Sam.
+    Choice fields accept codes or labels, case-insensitively; several values
+    for one parameter are OR-ed. Returns {field: [codes], "tags": [names],
+    "stylist": name} with only the parameters that were given.
+    """
+    filters = {}
+    for field, choices in CHOICES.items():
+        values = _split(params.get(field, ""))
+        if not values:
+            continue
+        lookup = {}
+        for code, label in choices:
+            lookup[code.lower()] = code
+            lookup[label.lower()] = code
+        codes = []
+        for value in values:
+            code = lookup.get(value.lower())
+            if code is None:
+                raise ValidationError({field: f"'{value}' is not one of: {', '.join(code for code, _ in choices)}"})
+            if code not in codes:
+                codes.append(code)
+        filters[field] = codes
+
+    tags = _split(params.get("tags", ""))
+    if tags:
+        filters["tags"] = tags
+    stylist = params.get("stylist", "").strip()
+    if stylist:
+        filters["stylist"] = stylist
+    return filters
+
+
+def filter_q(filters, exclude=None):
+    """ORM filter for parsed filters, leaving out the field named by exclude"""
+    q = Q()
+    for field, value in filters.items():
+        if field == exclude:
+            continue
+        if field == "tags":
+            # A subquery rather than a join so styles with several matching tags appear once
+            q &= Q(pk__in=Style.objects.filter(tags__name__in=value).values("pk"))
+        elif field == "stylist":
+            # Case-insensitive, in the form the Lower("stylist_name") index covers
+            q &= Q(Exact(Lower("stylist_name"), Lower(Value(value))))
+        else:
+            q &= Q(**{f"{field}__in": value})
+    return q
+
+
+class StyleFilterBackend(BaseFilterBackend):
+    """Apply parse_filters query params to a Style queryset"""
+
+    def filter_queryset(self, request, queryset, view):
+        filters = parse_filters(request.query_params)
+        return queryset.filter(filter_q(filters)) if filters else queryset
+
+
+def facet_counts(filters):
+    """
+    Style counts for every value of each choice field and the most used tags.
+    Each facet applies every active filter except its own, so the other values
+    of a field stay selectable. One grouped query per facet plus the total.
+    """
+    facets = {}
+    for field, choices in CHOICES.items():
+        counts = dict(
+            Style.objects.filter(filter_q(filters, exclude=field))
+            .values_list(field)
+            .annotate(count=Count("id"))
+            .order_by()
+        )
+        facets[field] = [
+            {"value": code, "label": label, "count": counts.get(code, 0)} for code, label in choices
+        ]
+
+    tags = (
+        Style.objects.filter(filter_q(filters, exclude="tags"), tags__isnull=False)
+        .values_list("tags__name")
+        .annotate(count=Count("id"))
+        .order_by("-count", "tags__name")[:FACET_TAG_LIMIT]
+    )
+    facets["tags"] = [{"value": name, "label": name, "count": count} for name, count in tags]
+
+    return {
+        "total": Style.objects.filter(filter_q(filters)).count(),
+        "filters": filters,
+        "facets": facets,
+    }
@@ -0,0 +1,85 @@
+"""
+Pre-serialized StyleSerializer output per style.
+
+Fragments are keyed by style id and updated_at, which changes on every save
+and is touched when a style's images or tags change (see styles.indexing),
+so a changed style simply misses. Media URLs are stored relative and made
+absolute for each request.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Style
+from .serializers import StyleSerializer
+
+
+def fragment_key(style):
+    return f"style-fragment:{style.id}:{style.updated_at.timestamp():.6f}"
+
+
+def _absolute_srcset(srcset, request):
+    return {
+        fmt: ", ".join(
+            f"{request.build_absolute_uri(url)} {descriptor}"
+            for url, descriptor in (candidate.rsplit(" ", 1) for candidate in candidates.split(", "))
+        )
+        for fmt, candidates in srcset.items()
+    }
+
+
+def _absolutize(fragment, request):
+    if request is None:
+        return fragment
+    images = [
+        {
+            **image,
+            **{
+                field: request.build_absolute_uri(image[field])
+                for field in ("image", "photo_url")
+                if image.get(field)
+            },
+            "srcset": _absolute_srcset(image.get("srcset", {}), request),
+        }
+        for image in fragment["style_image"]
+    ]
+    return {**fragment, "style_image": images}
+
+
+def _render(styles, fragments, request):
+    keys = [fragment_key(style) for style in styles]
+    missing = {key: style for key, style in zip(keys, styles) if key not in fragments}
+    if missing:
+        data = StyleSerializer(list(missing.values()), many=True).data
+        rendered = dict(zip(missing, data))
+        caches[settings.FRAGMENT_CACHE_ALIAS].set_many(rendered, timeout=settings.FRAGMENT_CACHE_TIMEOUT)
+        fragments = {**fragments, **rendered}
+    return [_absolutize(fragments[key], request) for key in keys]
+
+
+def render_styles(styles, request):
+    """
+    Serialized data for loaded styles, in order. Cached fragments are fetched
+    with one multi-get; only misses go through StyleSerializer (prefetch
+    images and tags for them with Style.objects.with_related()).
+    """
+    fragments = caches[settings.FRAGMENT_CACHE_ALIAS].get_many([fragment_key(style) for style in styles])
+    return _render(styles, fragments, request)
+
+
+def render_style_ids(style_ids, request):
+    """
+    Serialized data for the styles with the given ids, in order, skipping ids
+    that do not exist. Costs one query for the versions plus, on misses, the
+    usual with_related() queries for just the missing styles.
+    """
+    versions = Style.objects.only("id", "updated_at").in_bulk(style_ids)
+    styles = [versions[style_id] for style_id in style_ids if style_id in versions]
+
+    fragments = caches[settings.FRAGMENT_CACHE_ALIAS].get_many([fragment_key(style) for style in styles])
+    missing_ids = [style.id for style in styles if fragment_key(style) not in fragments]
+    if missing_ids:
+        loaded = Style.objects.with_related().in_bulk(missing_ids)
+        # Render misses from the freshly loaded rows, whose version is current
+        styles = [loaded.get(style.id, style) for style in styles]
+    return _render(styles, fragments, request)
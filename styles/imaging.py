@@ -0,0 +1,147 @@
+import base64
+import io
+import struct
+
+from PIL import Image as PILImage, ImageOps
+
+
+"""
+Pure Pillow image processing. Nothing here imports Django, so these functions
+can run in the worker processes of styles.derivatives.
+"""
+SAVE_OPTIONS = {
+    "webp": {"format": "WEBP", "method": 4},
+    "jpeg": {"format": "JPEG", "optimize": True, "progressive": True},
+}
+
+# Leading bytes of the upload formats accepted by Image.image
+SIGNATURES = {
+    "jpeg": b"\xff\xd8\xff",
+    "png": b"\x89PNG\r\n\x1a\n",
+}
+
+# EXIF orientations that rotate the image a quarter turn
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+PLACEHOLDER_WIDTH = 16
+
+
+def render_derivatives(data, widths, formats, quality):
+    """
+    Resize encoded image bytes to each width narrower than the original and
+    encode every size in each format. Returns {format: {width: bytes}}; an
+    original narrower than every width yields one derivative at its own size.
+    """
+    with PILImage.open(io.BytesIO(data)) as original:
+        # Let the JPEG decoder downscale by up to 8x while decoding
+        largest = max(widths)
+        if original.width > largest:
+            original.draft("RGB", (largest, original.height * largest // original.width))
+        image = ImageOps.exif_transpose(original)
+        image.load()
+
+    sizes = sorted({width for width in widths if width < image.width} or {image.width}, reverse=True)
+    derivatives = {fmt: {} for fmt in formats}
+    # Resize from the previous, larger result rather than the full original
+    for width in sizes:
+        height = max(1, round(image.height * width / image.width))
+        if (width, height) != image.size:
+            image = image.resize((width, height), PILImage.LANCZOS, reducing_gap=3.0)
+        for fmt in formats:
+            frame = image
+            if fmt == "jpeg" and frame.mode != "RGB":
+                frame = frame.convert("RGB")
+            elif fmt == "webp" and frame.mode not in ("RGB", "RGBA"):
+                frame = frame.convert("RGBA" if "A" in frame.getbands() else "RGB")
+            buffer = io.BytesIO()
+            frame.save(buffer, quality=quality, **SAVE_OPTIONS[fmt])
+            derivatives[fmt][width] = buffer.getvalue()
+    return derivatives
+
+
+def _flatten(image):
+    """RGB copy of image, with any transparency composited onto white"""
+    if image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = PILImage.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def analyze(fp):
+    """
+    Display width and height (after EXIF rotation), dominant color as #rrggbb
+    and a tiny base64 WebP placeholder of an encoded image file object.
+    """
+    with PILImage.open(fp) as original:
+        width, height = original.size
+        if original.getexif().get(0x0112) in TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+        # Only a thumbnail is needed, so JPEGs can be decoded at up to 1/8 scale
+        original.draft("RGB", (64, 64))
+        image = _flatten(ImageOps.exif_transpose(original))
+
+    image.thumbnail((64, 64))
+    quantized = image.quantize(colors=5)
+    _, index = max(quantized.getcolors())
+    red, green, blue = quantized.getpalette()[index * 3:index * 3 + 3]
+
+    preview = image.resize(
+        (PLACEHOLDER_WIDTH, max(1, round(PLACEHOLDER_WIDTH * image.height / image.width))), PILImage.LANCZOS
+    )
+    buffer = io.BytesIO()
+    preview.save(buffer, format="WEBP", quality=40)
+    return {
+        "width": width,
+        "height": height,
+        "dominant_color": f"#{red:02x}{green:02x}{blue:02x}",
+        "placeholder": "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode("ascii"),
+    }
+
+
+def analyze_bytes(data):
+    """analyze() for encoded image bytes, as sent to worker processes"""
+    return analyze(io.BytesIO(data))
+
+
+def sniff_format(head):
+    """"jpeg", "png" or "webp" from the first 12 bytes of a file, otherwise None"""
+    for fmt, signature in SIGNATURES.items():
+        if head.startswith(signature):
+            return fmt
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def _webp_size(head):
+    chunk = head[12:16]
+    if chunk == b"VP8 " and len(head) >= 30:
+        width, height = struct.unpack("<HH", head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and len(head) >= 25:
+        bits = int.from_bytes(head[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X" and len(head) >= 30:
+        return int.from_bytes(head[24:27], "little") + 1, int.from_bytes(head[27:30], "little") + 1
+    return None
+
+
+def header_size(head):
+    """
+    (width, height) from the first bytes of a JPEG, PNG or WebP file, or None
+    while the header is incomplete. Only headers are parsed, nothing is decoded.
+    """
+    fmt = sniff_format(head)
+    if fmt is None:
+        return None
+    if fmt == "webp":
+        # Pillow's WebP plugin needs the whole file, but the size is in the first chunk
+        return _webp_size(head)
+    try:
+        with PILImage.open(io.BytesIO(head), formats=[fmt.upper()]) as image:
+            return image.size
+    except PILImage.DecompressionBombError:
+        raise
+    except Exception:
+        return None
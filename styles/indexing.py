@@ -0,0 +1,302 @@
+import random
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import bump_catalog_version
+from .models import IndexOperation, Style, StyleIndexEntry
+from .neighbors import refresh_neighbors
+from .search_index import update_search_documents
+from .vector_search import embedding_key
+
+
+class ChangeSet(threading.local):
+    """Style changes collected by bulk_indexing() blocks in the current thread"""
+
+    def __init__(self):
+        # style_id -> index action, for changes that affect the vector index
+        self.pending = {}
+        # styles whose API representation changed without needing a reindex
+        self.touched = set()
+        self.bulk_depth = 0
+        # Catalog version bumps scheduled and done; see _schedule_bump
+        self.bumps_requested = 0
+        self.bumps_done = 0
+
+
+_changes = ChangeSet()
+
+
+def style_changed(style_id):
+    """Queue a reindex of the style in the current transaction"""
+    _record(style_id, "INDEX")
+
+
+def style_deleted(style_id):
+    """Queue the style's removal from the index in the current transaction"""
+    _record(style_id, "DELETE")
+
+
+def style_touched(style_id):
+    """Record a change to a style's images that does not affect its vector"""
+    if _changes.bulk_depth:
+        _changes.touched.add(style_id)
+        return
+    # Cached fragments are keyed by updated_at
+    Style.objects.filter(id=style_id).update(updated_at=timezone.now())
+    _schedule_bump()
+
+
+def _record(style_id, action):
+    if _changes.bulk_depth:
+        _changes.pending[style_id] = action
+        return
+    write_changes({style_id: action})
+
+
+def _enqueue(changes):
+    """
+    Upsert one pending IndexOperation per style. Rows no worker has claimed
+    yet take the new action, so repeated changes to a style in or across
+    transactions queue a single reindex; leased rows and rows backing off are
+    left alone and a new row is added, which the worker deduplicates.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # Lock the unclaimed rows so a worker cannot lease them between the read and the update
+        unclaimed = IndexOperation.objects.select_for_update().filter(
+            style_id__in=changes, status="PENDING", available_at__lte=now
+        )
+        existing = set(unclaimed.values_list("style_id", flat=True))
+        by_action = {}
+        for style_id in existing:
+            by_action.setdefault(changes[style_id], []).append(style_id)
+        for action, style_ids in by_action.items():
+            unclaimed.filter(style_id__in=style_ids).exclude(action=action).update(action=action)
+        IndexOperation.objects.bulk_create(
+            [
+                IndexOperation(style_id=style_id, action=action)
+                for style_id, action in changes.items()
+                if style_id not in existing
+            ],
+            batch_size=500,
+        )
+
+
+def write_changes(changes, touched=()):
+    """
+    Write the index operations for changed styles inside the current
+    transaction, so they commit or roll back with the change itself, then
+    refresh their full-text search documents and touch their updated_at so
+    cached fragments miss. The catalog version is bumped after commit.
+    """
+    if changes:
+        _enqueue(changes)
+    # Touched styles include bulk edits made with reindex=False
+    changed_ids = set(touched).union(style_id for style_id, action in changes.items() if action == "INDEX")
+    if changed_ids:
+        update_search_documents(changed_ids)
+        # Image and tag changes don't save the style itself
+        Style.objects.filter(id__in=changed_ids).update(updated_at=timezone.now())
+    if changes or changed_ids:
+        _schedule_bump()
+
+
+def _schedule_bump():
+    """Bump the catalog version once the current transaction commits"""
+    _changes.bumps_requested += 1
+    transaction.on_commit(partial(_bump, _changes.bumps_requested), robust=True)
+
+
+def _bump(requested):
+    # A transaction's callbacks all run at commit, so its first bump covers
+    # the rest; callbacks of rolled back transactions are simply dropped
+    if _changes.bumps_done >= requested:
+        return
+    _changes.bumps_done = _changes.bumps_requested
+    bump_catalog_version()
+
+
+@contextmanager
+def bulk_indexing(reindex=True):
+    """
+    Collect index operations instead of writing them per row, e.g. during
+    imports. They are written in bulk when the outermost block exits, in the
+    transaction current at that point, and dropped if it raises. Pass
+    reindex=False to skip the reindex and run index_styles later.
+    """
+    if not reindex:
+        pending, _changes.pending = _changes.pending, {}
+    _changes.bulk_depth += 1
+    try:
+        yield
+    finally:
+        _changes.bulk_depth -= 1
+        if not reindex:
+            # Skip the reindex, but the styles still changed for API caches
+            _changes.touched.update(_changes.pending)
+            _changes.pending = pending
+        if not _changes.bulk_depth:
+            changes, _changes.pending = _changes.pending, {}
+            touched, _changes.touched = _changes.touched, set()
+    if not _changes.bulk_depth:
+        write_changes(changes, touched)
+
+
+def claim_operations(batch_size, lease_seconds):
+    """
+    Claim up to batch_size due operations, plus any other pending operations
+    for the same styles so they can be deduplicated. Claimed rows are leased by
+    pushing available_at forward; if the worker dies they become due again.
+    """
+    now = timezone.now()
+    skip_locked = connection.features.has_select_for_update_skip_locked
+
+    with transaction.atomic():
+        pending = IndexOperation.objects.select_for_update(skip_locked=skip_locked).filter(
+            status="PENDING"
+        )
+        operations = list(
+            pending.filter(available_at__lte=now).order_by("available_at", "id")[:batch_size]
+        )
+        if not operations:
+            return []
+
+        claimed_ids = [operation.id for operation in operations]
+        operations += list(
+            pending.filter(style_id__in={operation.style_id for operation in operations})
+            .exclude(id__in=claimed_ids)
+        )
+
+        IndexOperation.objects.filter(id__in=[operation.id for operation in operations]).update(
+            available_at=now + timedelta(seconds=lease_seconds)
+        )
+
+    return operations
+
+
+def backoff_delay(attempts, base_seconds, max_seconds):
+    """Exponential backoff with jitter, capped at max_seconds"""
+    delay = min(max_seconds, base_seconds * (2 ** max(attempts - 1, 0)))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def process_operations(vector_service, operations, max_attempts=8, backoff_base=5, backoff_max=3600):
+    """
+    Apply claimed operations to the vector index. Only the latest operation per
+    style is applied; every claimed row for that style is then removed. Failed
+    styles are rescheduled with exponential backoff until max_attempts.
+    Returns (succeeded, failed) counts of styles.
+    """
+    latest = {}
+    for operation in sorted(operations, key=lambda operation: operation.id):
+        latest[operation.style_id] = operation.action
+
+    index_ids = [style_id for style_id, action in latest.items() if action == "INDEX"]
+    delete_ids = [style_id for style_id, action in latest.items() if action == "DELETE"]
+
+    styles = list(Style.objects.prefetch_related("tags").filter(id__in=index_ids))
+    # Styles deleted after being queued for indexing should leave the index too
+    found = {style.id for style in styles}
+    delete_ids += [style_id for style_id in index_ids if style_id not in found]
+
+    # Queued operations always reindex, even if the content hash is unchanged
+    succeeded = set(sync_styles(vector_service, styles, force=True)[0]) if styles else set()
+    if delete_ids and vector_service.delete_styles(delete_ids):
+        succeeded.update(delete_ids)
+
+    if succeeded:
+        try:
+            refresh_neighbors(succeeded)
+        except Exception as e:
+            # Neighbor lists are derived data; compute_neighbors can rebuild them
+            print(f"Error refreshing similar styles for {sorted(succeeded)}: {e}")
+
+    done = [operation.id for operation in operations if operation.style_id in succeeded]
+    IndexOperation.objects.filter(id__in=done).delete()
+
+    now = timezone.now()
+    failed = [operation for operation in operations if operation.style_id not in succeeded]
+    for operation in failed:
+        operation.attempts += 1
+        operation.last_error = "Vector index update failed; see worker output"
+        if operation.attempts >= max_attempts:
+            operation.status = "FAILED"
+        else:
+            operation.available_at = now + timedelta(
+                seconds=backoff_delay(operation.attempts, backoff_base, backoff_max)
+            )
+    IndexOperation.objects.bulk_update(failed, ["attempts", "last_error", "status", "available_at"])
+
+    return len(succeeded), len(latest) - len(succeeded)
+
+
+def sync_styles(vector_service, styles, batch_size=100, force=False):
+    """
+    Index the styles whose content hash differs from the one recorded when
+    they were last indexed (every style with force=True), then record the new
+    hashes and embeddings. Prefetch tags on styles.
+    Returns (indexed style ids, skipped count).
+    """
+    styles = list(styles)
+    hashes = {style.id: vector_service.content_hash(style) for style in styles}
+    if not force:
+        # Entries without a stored vector predate the embedding store
+        current = dict(
+            StyleIndexEntry.objects.filter(style_id__in=hashes, vector__isnull=False)
+            .values_list("style_id", "content_hash")
+        )
+        styles = [style for style in styles if current.get(style.id) != hashes[style.id]]
+    if not styles:
+        return [], len(hashes)
+
+    embeddings = vector_service.embed_styles(styles)
+    indexed = vector_service.index_styles(styles, batch_size=batch_size, embeddings=embeddings)
+    if indexed:
+        vectors = {style.id: embedding for style, embedding in zip(styles, embeddings)}
+        entries = []
+        for style_id in indexed:
+            entry = StyleIndexEntry(style_id=style_id, content_hash=hashes[style_id])
+            entry.set_vector(vectors[style_id], embedding_key(), settings.EMBEDDING_STORE_DTYPE)
+            entries.append(entry)
+        with transaction.atomic():
+            StyleIndexEntry.objects.filter(style_id__in=indexed).delete()
+            StyleIndexEntry.objects.bulk_create(entries)
+    return indexed, len(hashes) - len(styles)
+
+
+def reconcile_index(vector_service, batch_size=100):
+    """
+    Page through every id in the vector index, delete vectors whose style no
+    longer exists, and forget the recorded hash of styles missing from the
+    index so the next sync_styles pass indexes them again.
+    Returns (orphans deleted, styles missing from the index).
+    """
+    orphans = []
+    seen = set()
+    for page in vector_service.backend.list_ids(page_size=batch_size):
+        style_ids = {}
+        for vector_id in page:
+            prefix, _, style_id = vector_id.partition("_")
+            if prefix == "style" and style_id.isdigit():
+                style_ids[int(style_id)] = vector_id
+        existing = set(Style.objects.filter(id__in=style_ids).values_list("id", flat=True))
+        seen.update(existing)
+        orphans += [style_id for style_id in style_ids if style_id not in existing]
+
+    # Delete after listing so removals cannot shift the backend's pagination
+    deleted = 0
+    for start in range(0, len(orphans), batch_size):
+        batch = orphans[start:start + batch_size]
+        if vector_service.delete_styles(batch):
+            deleted += len(batch)
+
+    missing = [style_id for style_id in Style.objects.values_list("id", flat=True).iterator() if style_id not in seen]
+    for start in range(0, len(missing), batch_size):
+        StyleIndexEntry.objects.filter(style_id__in=missing[start:start + batch_size]).delete()
+    return deleted, len(missing)
@@ -0,0 +1,14 @@
+def iter_batches(queryset, batch_size, key='id'):
+    """
+    Yield lists of up to batch_size rows of queryset in key order. Each batch
+    is a keyset query (key > last key seen), so later batches cost no OFFSET
+    scan and rows changed behind the cursor are not read twice.
+    """
+    queryset = queryset.order_by(key)
+    last_key = 0
+    while True:
+        batch = list(queryset.filter(**{f'{key}__gt': last_key})[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_key = getattr(batch[-1], key)
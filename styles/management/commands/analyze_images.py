@@ -0,0 +1,47 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from styles.derivatives import analyze_images
+from styles.models import Image
+from ._batching import iter_batches
+
+
+class Command(BaseCommand):
+    help = 'Compute dimensions, dominant color and placeholder for existing images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Recompute images that already have a placeholder',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Originals read into memory and sent to the worker pool at once (default: 50)',
+        )
+
+    def handle(self, *args, **options):
+        images = Image.objects.exclude(image='')
+        if not options['force']:
+            images = images.filter(placeholder='')
+
+        total = images.count()
+        self.stdout.write(f"Analyzing {total} images with {settings.IMAGE_WORKERS} worker processes...")
+
+        started = time.monotonic()
+        processed = 0
+        updated = 0
+        for batch in iter_batches(images, options['batch_size']):
+            updated += analyze_images(batch)
+            processed += len(batch)
+            self.stdout.write(f"Processed {processed}/{total} images")
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(f"Analysis complete! {updated}/{total} images updated in {elapsed:.1f}s.")
+        )
+        if updated < total:
+            self.stdout.write(self.style.ERROR(f"❌ {total - updated} images failed; see the errors above"))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from styles.vector_backends import LocalVectorBackend, create_backend
+
+
+class Command(BaseCommand):
+    help = 'Fold the change log into the local vector index and drop deleted rows'
+
+    def handle(self, *args, **options):
+        backend = create_backend()
+        if not isinstance(backend, LocalVectorBackend):
+            raise CommandError("Compaction only applies to the local vector backend (VECTOR_BACKEND=local)")
+
+        before = backend.stats()
+        backend.compact()
+        after = backend.stats()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Compaction complete! Removed {before['deleted_vector_count']} deleted rows; "
+                f"{after['total_vector_count']} vectors remain."
+            )
+        )
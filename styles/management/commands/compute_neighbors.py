@@ -0,0 +1,34 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from styles.neighbors import compute_neighbors
+
+
+class Command(BaseCommand):
+    help = 'Precompute the most similar styles of every style from the stored embeddings'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count',
+            type=int,
+            default=settings.SIMILAR_STYLES_COUNT,
+            help=f'Neighbors stored per style (default: {settings.SIMILAR_STYLES_COUNT})',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=512,
+            help='Styles scored per matrix multiplication (default: 512)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Computing similar styles...")
+
+        started = time.monotonic()
+        written = compute_neighbors(count=options['count'], batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Neighbors computed! {written} styles updated in {elapsed:.1f}s.")
+        )
@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from styles.derivatives import generate_derivatives
+from styles.models import Image
+from ._batching import iter_batches
+
+
+class Command(BaseCommand):
+    help = 'Generate resized WebP/JPEG derivatives for existing images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate derivatives for images that already have them',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=20,
+            help='Originals read into memory and sent to the worker pool at once (default: 20)',
+        )
+
+    def handle(self, *args, **options):
+        images = Image.objects.exclude(image='')
+        if not options['force']:
+            images = images.filter(derivatives={})
+
+        total = images.count()
+        self.stdout.write(
+            f"Generating derivatives for {total} images with {settings.IMAGE_WORKERS} worker processes..."
+        )
+
+        started = time.monotonic()
+        processed = 0
+        updated = 0
+        for batch in iter_batches(images, options['batch_size']):
+            updated += generate_derivatives(batch)
+            processed += len(batch)
+            self.stdout.write(f"Processed {processed}/{total} images")
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(f"Derivatives complete! {updated}/{total} images updated in {elapsed:.1f}s.")
+        )
+        if updated < total:
+            self.stdout.write(self.style.ERROR(f"❌ {total - updated} images failed; see the errors above"))
@@ -1,34 +1,83 @@
+import time
+
 from django.core.management.base import BaseCommand
+from styles.cache import embedding_cache
+from styles.indexing import reconcile_index, sync_styles
+from styles.neighbors import refresh_neighbors
 from styles.models import Style
-from styles.vector_search import VectorSearchService
+from styles.vector_search import get_vector_service
+from ._batching import iter_batches
 
 class Command(BaseCommand):
-    help = 'Index all existing styles in Pinecone'
+    help = 'Index new and changed styles in Pinecone'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=200,
+            help='Styles loaded and embedded per request (default: 200)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Vectors sent per upsert or delete request (default: 100)',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Reindex every style, even if its content hash is unchanged (e.g. after switching backends)',
+        )
+        parser.add_argument(
+            '--reconcile',
+            action='store_true',
+            help='First delete vectors of removed styles and requeue styles missing from the index',
+        )
 
     def handle(self, *args, **options):
-        vector_service = VectorSearchService()
+        vector_service = get_vector_service()
 
-        styles = Style.objects.all()
-        total_styles = styles.count()
+        if options['reconcile']:
+            self.stdout.write("Reconciling vector index with the database...")
+            deleted, missing = reconcile_index(vector_service, batch_size=options['batch_size'])
+            self.stdout.write(f"Deleted {deleted} orphaned vectors, {missing} styles missing from the index")
+
+        total_styles = Style.objects.count()
 
         self.stdout.write(f"Indexing {total_styles} styles...")
 
-        success_count = 0
-        for i, style in enumerate(styles, 1):
-            self.stdout.write(f"Processing style {i}/{total_styles}: {style.title}")
+        started = time.monotonic()
+        processed = 0
+        indexed_ids = []
+        skipped_count = 0
+        for chunk in iter_batches(Style.objects.prefetch_related('tags'), options['chunk_size']):
+            indexed, skipped = sync_styles(
+                vector_service, chunk, batch_size=options['batch_size'], force=options['force']
+            )
+            processed += len(chunk)
+            indexed_ids += indexed
+            skipped_count += skipped
+            self.stdout.write(f"Processed {processed}/{total_styles} styles")
 
-            if vector_service.index_style(style):
-                success_count += 1
-                self.stdout.write(
-                    self.style.SUCCESS(f"✅ Indexed: {style.title}")
-                )
-            else:
+            if len(indexed) + skipped < len(chunk):
                 self.stdout.write(
-                    self.style.ERROR(f"❌ Failed to index: {style.title}")
+                    self.style.ERROR(f"❌ Failed to index {len(chunk) - len(indexed) - skipped} styles in this chunk")
                 )
 
+        success_count = len(indexed_ids)
+        if indexed_ids:
+            refreshed = refresh_neighbors(indexed_ids)
+            self.stdout.write(f"Refreshed {refreshed} similar style lists")
+
+        elapsed = time.monotonic() - started
+        rate = processed / elapsed if elapsed else 0.0
+
         self.stdout.write(
             self.style.SUCCESS(
-                f"Indexing complete! {success_count}/{total_styles} styles indexed successfully."
+                f"Indexing complete! {success_count} styles indexed, {skipped_count} unchanged, "
+                f"{total_styles - success_count - skipped_count} failed "
+                f"in {elapsed:.1f}s ({rate:.1f} styles/sec)."
             )
         )
+        self.stdout.write(embedding_cache.summary())
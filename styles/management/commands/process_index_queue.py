@@ -0,0 +1,76 @@
+import time
+
+from django.core.management.base import BaseCommand
+from styles.indexing import claim_operations, process_operations
+from styles.vector_search import get_vector_service
+
+
+class Command(BaseCommand):
+    help = 'Apply queued style index/delete operations to Pinecone'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Operations claimed per batch (default: 100)',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling for new operations instead of exiting when the queue is empty',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=2.0,
+            help='Seconds to wait between polls when the queue is empty (default: 2)',
+        )
+        parser.add_argument(
+            '--lease',
+            type=int,
+            default=300,
+            help='Seconds a claimed batch stays hidden from other workers (default: 300)',
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=8,
+            help='Attempts before an operation is marked as failed (default: 8)',
+        )
+        parser.add_argument(
+            '--backoff',
+            type=float,
+            default=5.0,
+            help='Base retry delay in seconds, doubled on every attempt (default: 5)',
+        )
+
+    def handle(self, *args, **options):
+        vector_service = get_vector_service()
+
+        total_succeeded = 0
+        total_failed = 0
+        while True:
+            operations = claim_operations(options['batch_size'], options['lease'])
+
+            if not operations:
+                if not options['loop']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            succeeded, failed = process_operations(
+                vector_service,
+                operations,
+                max_attempts=options['max_attempts'],
+                backoff_base=options['backoff'],
+            )
+            total_succeeded += succeeded
+            total_failed += failed
+            self.stdout.write(f"Processed {len(operations)} operations: {succeeded} styles synced, {failed} retrying")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Queue drained! {total_succeeded} styles synced, {total_failed} failures."
+            )
+        )
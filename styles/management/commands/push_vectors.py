@@ -0,0 +1,75 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from styles.models import Style, StyleIndexEntry
+from styles.vector_backends import BACKENDS, create_backend
+from styles.vector_search import embedding_key, get_vector_service
+from ._batching import iter_batches
+
+
+class Command(BaseCommand):
+    help = 'Load stored style embeddings into a vector backend without calling OpenAI'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backend',
+            choices=list(BACKENDS),
+            help='Backend to fill (default: VECTOR_BACKEND)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Stored vectors loaded from the database per query (default: 500)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Vectors sent per upsert request (default: 100)',
+        )
+
+    def handle(self, *args, **options):
+        vector_service = get_vector_service()
+        name = options['backend'] or settings.VECTOR_BACKEND
+        backend = vector_service.backend if name == settings.VECTOR_BACKEND else create_backend(name)
+
+        total_styles = Style.objects.count()
+        self.stdout.write(f"Pushing stored vectors for {total_styles} styles to the {name} backend...")
+
+        started = time.monotonic()
+        pushed = 0
+        # Entries for the current embedding model and size, with their styles and tags
+        entries = (
+            StyleIndexEntry.objects.select_related('style')
+            .prefetch_related('style__tags')
+            .filter(model=embedding_key(), vector__isnull=False)
+        )
+        for chunk in iter_batches(entries, options['chunk_size'], key='style_id'):
+            vectors = [
+                (f"style_{entry.style_id}", entry.get_vector().tolist(), vector_service.build_metadata(entry.style))
+                for entry in chunk
+            ]
+            written = vector_service.upsert_vectors(vectors, batch_size=options['batch_size'], backend=backend)
+            pushed += len(written)
+            self.stdout.write(f"Pushed {pushed} vectors")
+
+            if len(written) < len(vectors):
+                self.stdout.write(
+                    self.style.ERROR(f"❌ Failed to push {len(vectors) - len(written)} vectors in this chunk")
+                )
+
+        elapsed = time.monotonic() - started
+        rate = pushed / elapsed if elapsed else 0.0
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Push complete! {pushed}/{total_styles} styles pushed in {elapsed:.1f}s ({rate:.1f} vectors/sec)."
+            )
+        )
+        if pushed < total_styles:
+            self.stdout.write(
+                f"{total_styles - pushed} styles have no stored {embedding_key()} vector; "
+                f"run `python manage.py index_styles` to embed them."
+            )
@@ -0,0 +1,179 @@
+import random
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from styles.cache import embedding_cache
+from styles.models import Style, StyleIndexEntry
+from styles.vector_backends import BACKENDS, create_backend
+from styles.vector_search import embedding_key, get_vector_service
+from ._batching import iter_batches
+
+
+class Command(BaseCommand):
+    help = (
+        'Re-embed every style at a reduced dimension into a separate index and '
+        'report recall@k against the current index before cutting over'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dimensions',
+            type=int,
+            required=True,
+            help='Embedding size for the new index, e.g. 256 or 512',
+        )
+        parser.add_argument(
+            '--backend',
+            choices=list(BACKENDS),
+            help='Backend for the new index (default: VECTOR_BACKEND)',
+        )
+        parser.add_argument(
+            '--path',
+            help='Directory for a new local index (default: VECTOR_LOCAL_PATH with the dimension appended)',
+        )
+        parser.add_argument(
+            '--dtype',
+            choices=['float32', 'int8'],
+            help='Storage type for a new local index (default: VECTOR_LOCAL_DTYPE)',
+        )
+        parser.add_argument(
+            '--index-name',
+            help='Name of an existing, empty Pinecone index created with the new dimension',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=200,
+            help='Styles loaded and embedded per request (default: 200)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Vectors sent per upsert request (default: 100)',
+        )
+        parser.add_argument(
+            '--queries',
+            help='File of evaluation queries, one per line (default: a sample of style titles)',
+        )
+        parser.add_argument(
+            '--sample',
+            type=int,
+            default=100,
+            help='Style titles sampled as evaluation queries when --queries is not given (default: 100)',
+        )
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=10,
+            help='k for the recall@k report (default: 10)',
+        )
+
+    def create_target(self, options):
+        name = options['backend'] or settings.VECTOR_BACKEND
+        if name == 'pinecone':
+            if not options['index_name']:
+                raise CommandError("--index-name is required for a Pinecone target")
+            return create_backend(name, index_name=options['index_name'])
+        path = options['path'] or f"{settings.VECTOR_LOCAL_PATH}_{options['dimensions']}"
+        return create_backend(name, path=path, dtype=options['dtype'])
+
+    def load_queries(self, options):
+        if options['queries']:
+            with open(options['queries']) as f:
+                return [line.strip() for line in f if line.strip()]
+        titles = list(Style.objects.values_list('title', flat=True))
+        return random.sample(titles, min(options['sample'], len(titles)))
+
+    def reference_index(self):
+        """Normalized matrix of the stored vectors for the current embedding config"""
+        entries = StyleIndexEntry.objects.filter(model=embedding_key(), vector__isnull=False)
+        style_ids = []
+        rows = []
+        for entry in entries.only('style_id', 'vector', 'vector_dtype').iterator():
+            style_ids.append(entry.style_id)
+            rows.append(entry.get_vector())
+        if not rows:
+            return style_ids, None
+        matrix = np.vstack(rows)
+        return style_ids, matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+    def handle(self, *args, **options):
+        vector_service = get_vector_service()
+        dimensions = options['dimensions']
+        target = self.create_target(options)
+
+        total_styles = Style.objects.count()
+        self.stdout.write(f"Re-embedding {total_styles} styles at {dimensions} dimensions...")
+
+        started = time.monotonic()
+        processed = 0
+        written = 0
+        for chunk in iter_batches(Style.objects.prefetch_related('tags'), options['chunk_size']):
+            embeddings = vector_service.generate_embeddings(
+                [vector_service.create_style_text(style) for style in chunk], dimensions=dimensions
+            )
+            vectors = [
+                (f"style_{style.id}", embedding, vector_service.build_metadata(style))
+                for style, embedding in zip(chunk, embeddings)
+                if embedding
+            ]
+            written += len(vector_service.upsert_vectors(vectors, batch_size=options['batch_size'], backend=target))
+            processed += len(chunk)
+            self.stdout.write(f"Processed {processed}/{total_styles} styles")
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(f"Re-embedding complete! {written}/{total_styles} styles written in {elapsed:.1f}s.")
+        )
+
+        self.report_recall(vector_service, target, options)
+        self.stdout.write(embedding_cache.summary())
+
+    def report_recall(self, vector_service, target, options):
+        style_ids, reference = self.reference_index()
+        if reference is None:
+            self.stdout.write(
+                self.style.ERROR(
+                    f"❌ No stored {embedding_key()} vectors to compare against; run `python manage.py index_styles` first"
+                )
+            )
+            return
+
+        queries = self.load_queries(options)
+        k = options['top_k']
+        reference_queries = vector_service.generate_embeddings(queries)
+        candidate_queries = vector_service.generate_embeddings(queries, dimensions=options['dimensions'])
+
+        recalls = []
+        for reference_query, candidate_query in zip(reference_queries, candidate_queries):
+            if not reference_query or not candidate_query:
+                continue
+            # Exact top-k over the current full-size vectors is the ground truth
+            scores = reference @ np.asarray(reference_query, dtype=np.float32)
+            top = np.argsort(-scores)[:k]
+            expected = {f"style_{style_ids[row]}" for row in top}
+            matches = target.query(vector=candidate_query, top_k=k, include_metadata=False)['matches']
+            found = {match['id'] for match in matches}
+            recalls.append(len(expected & found) / len(expected))
+
+        if not recalls:
+            self.stdout.write(self.style.ERROR("❌ Could not embed any evaluation queries"))
+            return
+
+        reference_size = reference.shape[1]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"recall@{k} of the {options['dimensions']}-dimension index against the current "
+                f"{reference_size}-dimension index: {np.mean(recalls):.3f} "
+                f"(min {min(recalls):.2f}) over {len(recalls)} queries; vectors are "
+                f"{options['dimensions'] / reference_size:.0%} of the current size."
+            )
+        )
+        self.stdout.write(
+            f"To cut over, set EMBEDDING_DIMENSIONS={options['dimensions']} and point the vector "
+            f"backend at the new index, then run `python manage.py index_styles` "
+            f"(embeddings are served from the cache)."
+        )
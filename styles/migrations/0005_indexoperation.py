@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:39
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('styles', '0004_auto_20251110_2009'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexOperation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('INDEX', 'Index'), ('DELETE', 'Delete')], default='INDEX', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('FAILED', 'Failed')], default='PENDING', max_length=10)),
+                ('style_id', models.BigIntegerField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Index operation',
+                'verbose_name_plural': 'Index operations',
+                'indexes': [models.Index(fields=['status', 'available_at'], name='indexop_status_available_idx')],
+            },
+        ),
+    ]
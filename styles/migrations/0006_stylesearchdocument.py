@@ -0,0 +1,112 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+FTS_TABLE = "styles_search_fts"
+DOCUMENT_TABLE = "styles_stylesearchdocument"
+
+# External-content FTS5 table; the triggers keep it in step with the document table
+SQLITE_FTS = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        document, content='{DOCUMENT_TABLE}', content_rowid='style_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {DOCUMENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, document) VALUES (new.style_id, new.document);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {DOCUMENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, document) VALUES ('delete', old.style_id, old.document);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON {DOCUMENT_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, document) VALUES ('delete', old.style_id, old.document);
+        INSERT INTO {FTS_TABLE}(rowid, document) VALUES (new.style_id, new.document);
+    END""",
+]
+
+
+def create_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        try:
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+                cursor.execute("DROP TABLE temp.fts5_probe")
+        except Exception:
+            # SQLite built without FTS5: search falls back to the Python index
+            return
+        for statement in SQLITE_FTS:
+            schema_editor.execute(statement)
+    elif vendor == "mysql":
+        schema_editor.execute(
+            f"ALTER TABLE {DOCUMENT_TABLE} ADD FULLTEXT INDEX stylesearchdoc_document_ft (document)"
+        )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        for suffix in ["ai", "ad", "au"]:
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif vendor == "mysql":
+        schema_editor.execute(f"ALTER TABLE {DOCUMENT_TABLE} DROP INDEX stylesearchdoc_document_ft")
+
+
+def build_document(title, stylist_name, description, tag_names):
+    # Frozen copy of styles.search_index.build_document as of this migration
+    return " ".join(part for part in [title, stylist_name, description, " ".join(tag_names)] if part)
+
+
+def build_documents(apps, schema_editor):
+    Style = apps.get_model("styles", "Style")
+    StyleSearchDocument = apps.get_model("styles", "StyleSearchDocument")
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    TaggedItem = apps.get_model("taggit", "TaggedItem")
+
+    tag_names = {}
+    content_type = ContentType.objects.filter(app_label="styles", model="style").first()
+    if content_type:
+        for style_id, name in TaggedItem.objects.filter(content_type=content_type).values_list(
+            "object_id", "tag__name"
+        ):
+            tag_names.setdefault(style_id, []).append(name)
+
+    StyleSearchDocument.objects.bulk_create(
+        [
+            StyleSearchDocument(
+                style_id=style.id,
+                document=build_document(
+                    style.title, style.stylist_name, style.description, tag_names.get(style.id, [])
+                ),
+            )
+            for style in Style.objects.all().iterator()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('taggit', '0005_auto_20220424_2025'),
+        ('styles', '0005_indexoperation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StyleSearchDocument',
+            fields=[
+                ('style', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='styles.style')),
+                ('document', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name': 'Style search document',
+                'verbose_name_plural': 'Style search documents',
+            },
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+        migrations.RunPython(build_documents, migrations.RunPython.noop),
+    ]
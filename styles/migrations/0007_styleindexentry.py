@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('styles', '0006_stylesearchdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StyleIndexEntry',
+            fields=[
+                ('style', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='index_entry', serialize=False, to='styles.style')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('indexed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Style index entry',
+                'verbose_name_plural': 'Style index entries',
+            },
+        ),
+    ]
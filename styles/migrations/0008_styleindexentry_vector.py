@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('styles', '0007_styleindexentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='styleindexentry',
+            name='dimensions',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='styleindexentry',
+            name='model',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='styleindexentry',
+            name='vector',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='styleindexentry',
+            name='vector_dtype',
+            field=models.CharField(choices=[('float16', 'float16'), ('float32', 'float32')], default='float32', max_length=10),
+        ),
+    ]
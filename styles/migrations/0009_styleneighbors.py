@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('styles', '0008_styleindexentry_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StyleNeighbors',
+            fields=[
+                ('style', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='neighbors', serialize=False, to='styles.style')),
+                ('neighbor_ids', models.JSONField(default=list)),
+                ('scores', models.JSONField(default=list)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Style neighbors',
+                'verbose_name_plural': 'Style neighbors',
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('styles', '0009_styleneighbors'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='style',
+            index=models.Index(fields=['face_shape'], name='style_face_shape_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='style',
+            index=models.Index(fields=['gender'], name='style_gender_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='style',
+            index=models.Index(fields=['length'], name='style_length_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='style',
+            index=models.Index(fields=['maintenance'], name='style_maintenance_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='style',
+            index=models.Index(fields=['texture'], name='style_texture_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='style',
+            index=models.Index(fields=['thickness'], name='style_thickness_idx'),
+        ),
+    ]
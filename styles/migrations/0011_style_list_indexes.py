@@ -0,0 +1,69 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('styles', '0010_style_choice_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='style',
+            name='style_face_shape_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='style',
+            name='style_gender_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='style',
+            name='style_length_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='style',
+            name='style_maintenance_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='style',
+            name='style_texture_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='style',
+            name='style_thickness_idx',
+        ),
+        migrations.AddIndex(
+            model_name='style',
+            index=models.Index(fields=['created_at', 'id'], name='style_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='style',
+            index=models.Index(fields=['face_shape', 'created_at', 'id'], name='style_face_shape_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='style',
+            index=models.Index(fields=['gender', 'created_at', 'id'], name='style_gender_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='style',
+            index=models.Index(fields=['length', 'created_at', 'id'], name='style_length_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='style',
+            index=models.Index(fields=['maintenance', 'created_at', 'id'], name='style_maintenance_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='style',
+            index=models.Index(fields=['texture', 'created_at', 'id'], name='style_texture_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='style',
+            index=models.Index(fields=['thickness', 'created_at', 'id'], name='style_thickness_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='style',
+            index=models.Index(fields=['stylist_name', 'created_at', 'id'], name='style_stylist_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:30
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('styles', '0013_image_preview'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='style',
+            name='style_stylist_idx',
+        ),
+        migrations.AddIndex(
+            model_name='style',
+            index=models.Index(django.db.models.functions.text.Lower('stylist_name'), models.F('created_at'), models.F('id'), name='style_stylist_idx'),
+        ),
+    ]
@@ -1,9 +1,14 @@
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from taggit.managers import TaggableManager
+import numpy as np
 import os
 
+from .imaging import analyze
+
 
 """
 Tuples for choice options
@@ -36,21 +41,30 @@ IMAGE_VIEW = [
 
 MAINTENANCE_CHOICES = [("LOW", "Low"), ("MEDIUM", "Medium"), ("HIGH", "High")]
 
+INDEX_ACTIONS = [("INDEX", "Index"), ("DELETE", "Delete")]
+
+INDEX_STATUS = [("PENDING", "Pending"), ("FAILED", "Failed")]
+
+VECTOR_DTYPES = [("float16", "float16"), ("float32", "float32")]
+
+# Also enforced while uploads stream in, see styles.uploads
+IMAGE_EXTENSIONS = [".jpg", ".jpeg", ".png", ".webp"]
+MAX_IMAGE_SIZE_MB = 10
+
 
 def validate_image_file_extension(value):
     """Validate that uploaded file is a supported image format"""
     ext = os.path.splitext(value.name)[1].lower()
-    valid_extensions = [".jpg", ".jpeg", ".png", ".webp"]
-    if ext not in valid_extensions:
+    if ext not in IMAGE_EXTENSIONS:
         raise ValidationError(
-            f'Unsupported file extension {ext}. Allowed extensions: {", ".join(valid_extensions)}'
+            f'Unsupported file extension {ext}. Allowed extensions: {", ".join(IMAGE_EXTENSIONS)}'
         )
 
 
 def validate_image_file_size(value):
     """Validate that uploaded file is not too large"""
     filesize = value.size
-    max_size_mb = 10  # 10MB limit
+    max_size_mb = MAX_IMAGE_SIZE_MB
     max_size_bytes = max_size_mb * 1024 * 1024
 
     if filesize > max_size_bytes:
@@ -59,6 +73,12 @@ def validate_image_file_size(value):
         )
 
 
+class StyleQuerySet(models.QuerySet):
+    def with_related(self):
+        """Load images and tags in one extra query each, as StyleSerializer needs them"""
+        return self.prefetch_related("style_image", "tags")
+
+
 class Style(models.Model):
     """
     Individual Style linked to a specific Hair Stylist
@@ -109,12 +129,27 @@ class Style(models.Model):
         help_text="Add any additional tags like 'blonde' for hair color", blank=True
     )
 
+    objects = StyleQuerySet.as_manager()
+
     def __str__(self):
         return self.title
 
     class Meta:
         verbose_name = _("Style")
         verbose_name_plural = _("Styles")
+        # Lists are ordered by (created_at, id), optionally filtered by one of
+        # these fields; facet counts group by the leading column
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="style_created_idx"),
+            models.Index(fields=["face_shape", "created_at", "id"], name="style_face_shape_idx"),
+            models.Index(fields=["gender", "created_at", "id"], name="style_gender_idx"),
+            models.Index(fields=["length", "created_at", "id"], name="style_length_idx"),
+            models.Index(fields=["maintenance", "created_at", "id"], name="style_maintenance_idx"),
+            models.Index(fields=["texture", "created_at", "id"], name="style_texture_idx"),
+            models.Index(fields=["thickness", "created_at", "id"], name="style_thickness_idx"),
+            # The stylist filter ignores case
+            models.Index(Lower("stylist_name"), "created_at", "id", name="style_stylist_idx"),
+        ]
 
 
 class Image(models.Model):
@@ -136,10 +171,158 @@ class Image(models.Model):
         max_length=10,
         default="FRONT",
     )
+    # {format: {width: storage name}} of resized copies, see styles.derivatives
+    derivatives = models.JSONField(default=dict, blank=True, editable=False)
+    # Let clients reserve space and paint a preview before the image loads
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    dominant_color = models.CharField(max_length=7, blank=True, editable=False)
+    placeholder = models.TextField(blank=True, editable=False)
+
+    PREVIEW_FIELDS = ["width", "height", "dominant_color", "placeholder"]
 
     def __str__(self):
         return self.image_alt
 
+    def save(self, *args, **kwargs):
+        # New uploads are analyzed once, before they are written to storage
+        if self.image and not self.image._committed:
+            self.set_preview(self.image)
+        super().save(*args, **kwargs)
+
+    def set_preview(self, fp):
+        """Set the preview fields from an encoded image file object"""
+        try:
+            preview = analyze(fp)
+        except Exception as e:
+            print(f"Error analyzing image {self.image.name}: {e}")
+            return
+        finally:
+            fp.seek(0)
+        for field, value in preview.items():
+            setattr(self, field, value)
+
     class Meta:
         verbose_name = _("Image")
         verbose_name_plural = _("Images")
+
+
+class IndexOperation(models.Model):
+    """
+    Pending vector index change for a Style (outbox).
+
+    Rows are written by the Style signals inside the transaction that changed
+    the style and drained by the `process_index_queue` command. style_id is a
+    plain column so delete operations outlive the Style row.
+    """
+
+    action = models.CharField(
+        choices=INDEX_ACTIONS,
+        max_length=10,
+        default="INDEX",
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_error = models.TextField(blank=True)
+    status = models.CharField(
+        choices=INDEX_STATUS,
+        max_length=10,
+        default="PENDING",
+    )
+    style_id = models.BigIntegerField(db_index=True)
+
+    def __str__(self):
+        return f"{self.get_action_display()} style {self.style_id}"
+
+    class Meta:
+        verbose_name = _("Index operation")
+        verbose_name_plural = _("Index operations")
+        indexes = [
+            models.Index(fields=["status", "available_at"], name="indexop_status_available_idx"),
+        ]
+
+
+class StyleSearchDocument(models.Model):
+    """
+    Denormalized text of a Style (title, stylist, description and tag names)
+    covered by the full-text index behind the lexical search fallback.
+    Rebuilt from styles.search_index when a style's changes are flushed.
+    """
+
+    style = models.OneToOneField(
+        Style, models.CASCADE, primary_key=True, related_name="search_document"
+    )
+    document = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"Search document for style {self.style_id}"
+
+    class Meta:
+        verbose_name = _("Style search document")
+        verbose_name_plural = _("Style search documents")
+
+
+class StyleIndexEntry(models.Model):
+    """
+    Hash of the text and metadata last sent to the vector index for a Style,
+    so unchanged styles can be skipped by `index_styles`, plus the embedding
+    itself so any backend can be rebuilt with `push_vectors` without
+    re-embedding.
+    """
+
+    style = models.OneToOneField(
+        Style, models.CASCADE, primary_key=True, related_name="index_entry"
+    )
+    content_hash = models.CharField(max_length=64)
+    indexed_at = models.DateTimeField(auto_now=True)
+    model = models.CharField(max_length=100, blank=True)
+    dimensions = models.PositiveIntegerField(null=True, blank=True)
+    vector = models.BinaryField(null=True, blank=True)
+    vector_dtype = models.CharField(
+        choices=VECTOR_DTYPES,
+        max_length=10,
+        default="float32",
+    )
+
+    def __str__(self):
+        return f"Index entry for style {self.style_id}"
+
+    def set_vector(self, values, model, dtype="float32"):
+        """Store an embedding as packed little-endian floats"""
+        array = np.asarray(values, dtype=np.dtype(dtype).newbyteorder("<"))
+        self.vector = array.tobytes()
+        self.vector_dtype = dtype
+        self.dimensions = len(array)
+        self.model = model
+
+    def get_vector(self):
+        """The stored embedding as a float32 array, or None"""
+        if self.vector is None:
+            return None
+        return np.frombuffer(self.vector, dtype=np.dtype(self.vector_dtype).newbyteorder("<")).astype(np.float32)
+
+    class Meta:
+        verbose_name = _("Style index entry")
+        verbose_name_plural = _("Style index entries")
+
+
+class StyleNeighbors(models.Model):
+    """
+    Precomputed most similar styles for a Style, nearest first, from the
+    stored embeddings. Maintained by styles.neighbors.
+    """
+
+    style = models.OneToOneField(
+        Style, models.CASCADE, primary_key=True, related_name="neighbors"
+    )
+    neighbor_ids = models.JSONField(default=list)
+    scores = models.JSONField(default=list)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Neighbors of style {self.style_id}"
+
+    class Meta:
+        verbose_name = _("Style neighbors")
+        verbose_name_plural = _("Style neighbors")
@@ -0,0 +1,111 @@
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .models import StyleIndexEntry, StyleNeighbors
+from .vector_search import embedding_key
+
+
+def load_vectors():
+    """(style ids, L2-normalized float32 matrix) of the stored embeddings for the current config"""
+    entries = StyleIndexEntry.objects.filter(model=embedding_key(), vector__isnull=False).order_by("style_id")
+    style_ids = []
+    rows = []
+    for entry in entries.only("style_id", "vector", "vector_dtype").iterator():
+        style_ids.append(entry.style_id)
+        rows.append(entry.get_vector())
+    if not rows:
+        return np.array([], dtype=np.int64), None
+    matrix = np.vstack(rows)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    return np.array(style_ids, dtype=np.int64), matrix
+
+
+def nearest(matrix, rows, count, batch_size=512):
+    """
+    Yield (row, neighbor rows, scores) for each row, nearest first and
+    excluding the row itself, scoring batch_size rows per matrix product.
+    """
+    count = min(count, len(matrix) - 1)
+    if count <= 0:
+        for row in rows:
+            yield row, np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+        return
+
+    for start in range(0, len(rows), batch_size):
+        batch = np.asarray(rows[start:start + batch_size])
+        scores = matrix[batch] @ matrix.T
+        scores[np.arange(len(batch)), batch] = -np.inf
+        top = np.argpartition(-scores, count - 1, axis=1)[:, :count]
+        for position, row in enumerate(batch):
+            candidates = top[position]
+            order = candidates[np.argsort(-scores[position, candidates])]
+            yield row, order, scores[position, order]
+
+
+def _save(style_ids, results):
+    neighbors = [
+        StyleNeighbors(
+            style_id=int(style_ids[row]),
+            neighbor_ids=[int(style_ids[neighbor]) for neighbor in neighbor_rows],
+            scores=[round(float(score), 4) for score in scores],
+        )
+        for row, neighbor_rows, scores in results
+    ]
+    with transaction.atomic():
+        StyleNeighbors.objects.filter(style_id__in=[neighbor.style_id for neighbor in neighbors]).delete()
+        StyleNeighbors.objects.bulk_create(neighbors, batch_size=500)
+    return len(neighbors)
+
+
+def compute_neighbors(count=None, batch_size=512):
+    """Recompute the neighbor list of every style with a stored vector; returns lists written"""
+    count = count or settings.SIMILAR_STYLES_COUNT
+    style_ids, matrix = load_vectors()
+    if matrix is None:
+        return 0
+    written = 0
+    rows = np.arange(len(style_ids))
+    # Save in slices so a large catalog never holds every list in memory
+    for start in range(0, len(rows), batch_size * 8):
+        written += _save(style_ids, nearest(matrix, rows[start:start + batch_size * 8], count, batch_size))
+    StyleNeighbors.objects.exclude(style_id__in=style_ids.tolist()).delete()
+    return written
+
+
+def refresh_neighbors(changed_ids, count=None, batch_size=512):
+    """
+    Update neighbor lists after the given styles were reindexed or deleted.
+    Recomputed lists: the changed styles' own, every list that currently
+    contains one of them, and every list a changed style now scores high
+    enough to enter. Returns the number of lists written.
+    """
+    count = count or settings.SIMILAR_STYLES_COUNT
+    changed_ids = set(changed_ids)
+    if not changed_ids:
+        return 0
+    style_ids, matrix = load_vectors()
+    if matrix is None:
+        return 0
+
+    row_of = {int(style_id): row for row, style_id in enumerate(style_ids)}
+    changed_rows = [row_of[style_id] for style_id in changed_ids if style_id in row_of]
+
+    # Lowest score currently in each full list; shorter lists take anything
+    threshold = np.full(len(style_ids), -np.inf, dtype=np.float32)
+    affected = set(changed_rows)
+    for style_id, neighbor_ids, scores in StyleNeighbors.objects.values_list("style_id", "neighbor_ids", "scores"):
+        row = row_of.get(style_id)
+        if row is None:
+            continue
+        if changed_ids.intersection(neighbor_ids):
+            affected.add(row)
+        elif len(scores) >= count:
+            threshold[row] = min(scores)
+
+    if changed_rows:
+        similarity = matrix @ matrix[changed_rows].T
+        similarity[changed_rows, np.arange(len(changed_rows))] = -np.inf
+        affected.update(np.flatnonzero((similarity > threshold[:, None]).any(axis=1)).tolist())
+
+    return _save(style_ids, nearest(matrix, sorted(affected), count, batch_size))
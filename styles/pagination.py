@@ -0,0 +1,33 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class StyleCursorPagination(CursorPagination):
+    """Keyset pagination on (created_at, id); no COUNT query and no OFFSET scan"""
+
+    ordering = ("created_at", "id")
+
+
+class StylePagination(PageNumberPagination):
+    """
+    Page numbers by default. Pass ?pagination=cursor to switch to keyset
+    pagination, whose cost does not grow with page depth; the `next` and
+    `previous` links carry the cursor.
+    """
+
+    def __init__(self):
+        self.cursor_pagination = StyleCursorPagination()
+        self.use_cursor = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = (
+            request.query_params.get("pagination") == "cursor"
+            or self.cursor_pagination.cursor_query_param in request.query_params
+        )
+        if self.use_cursor:
+            return self.cursor_pagination.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.use_cursor:
+            return self.cursor_pagination.get_paginated_response(data)
+        return super().get_paginated_response(data)
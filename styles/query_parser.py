@@ -0,0 +1,121 @@
+import re
+
+from django.db.models import Q
+
+from .filters import CHOICES
+from .models import FACE_SHAPE
+
+
+"""
+Phrases recognised for each filterable Style field, keyed by choice code.
+Choice labels need context where they are ambiguous: "medium" alone means
+length, but "medium maintenance" and "medium thickness" do not.
+"""
+PHRASES = {
+    "length": {
+        "SHORT": ["short", "pixie", "cropped", "buzz cut", "buzzcut", "chin length", "ear length"],
+        "MEDIUM": ["medium", "medium length", "mid length", "mid-length", "shoulder length", "shoulder-length", "lob"],
+        "LONG": ["long", "waist length", "long length"],
+    },
+    "texture": {
+        "STRAIGHT": ["straight", "sleek"],
+        "WAVY": ["wavy", "waves", "beachy"],
+        "CURLY": ["curly", "curls"],
+        "COILY": ["coily", "coils", "kinky", "type 4", "4c"],
+    },
+    "thickness": {
+        "FINE": ["fine", "thin", "fine hair", "thin hair"],
+        "MEDIUM": ["medium thickness", "medium density", "medium thick"],
+        "THICK": ["thick", "dense", "thick hair", "lots of hair"],
+    },
+    "maintenance": {
+        "LOW": ["low maintenance", "low-maintenance", "low upkeep", "easy to maintain", "wash and go", "wash-and-go"],
+        "MEDIUM": ["medium maintenance", "moderate maintenance"],
+        "HIGH": ["high maintenance", "high-maintenance", "high upkeep"],
+    },
+    "gender": {
+        "WOMAN": ["woman", "women", "womens", "women's", "female", "ladies", "lady", "girl", "girls"],
+        "MAN": ["man", "men", "mens", "men's", "male", "guy", "guys", "boy", "boys"],
+        "OTHER": ["non-binary", "nonbinary", "androgynous"],
+    },
+    "face_shape": {},
+}
+
+# Filler words dropped from the leftover text used for keyword matching
+STOPWORDS = {
+    "a", "an", "and", "any", "cut", "cuts", "do", "for", "hair", "haircut", "haircuts",
+    "hairstyle", "hairstyles", "i", "in", "is", "look", "looks", "me", "my", "of", "on",
+    "or", "something", "style", "styles", "that", "the", "to", "want", "with",
+}
+
+# A phrase directly after one of these is excluded rather than filtered on: "not curly"
+NEGATION = re.compile(r"(?:^|\s)(?:not|no|without)\s+$")
+
+
+def _compile():
+    # Face shapes only count with "face" nearby: "round face", "heart-shaped face"
+    for code, label in FACE_SHAPE:
+        name = label.lower()
+        PHRASES["face_shape"][code] = [f"{name} face", f"{name} faces", f"{name}-shaped face", f"{name} shaped face", f"{name} face shape"]
+
+    lookup = {}
+    for field, codes in PHRASES.items():
+        valid = {code for code, _ in CHOICES[field]}
+        for code, phrases in codes.items():
+            if code not in valid:
+                raise ValueError(f"{code} is not a {field} choice")
+            for phrase in phrases:
+                lookup.setdefault(phrase, (field, code))
+    # Longest phrases first so "medium maintenance" wins over "medium"
+    alternatives = sorted(lookup, key=len, reverse=True)
+    pattern = re.compile(r"(?<![\w-])(" + "|".join(re.escape(phrase) for phrase in alternatives) + r")(?![\w-])")
+    return pattern, lookup
+
+
+PATTERN, LOOKUP = _compile()
+
+
+class ParsedQuery:
+    """Structured attribute filters extracted from a search query plus leftover keywords"""
+
+    def __init__(self, text, filters, remainder):
+        self.text = text
+        self.filters = filters
+        self.remainder = remainder
+
+    def vector_filter(self):
+        """Metadata filter for VectorBackend.query (Pinecone syntax)"""
+        return {field: {"$in": codes} for field, codes in self.filters.items()} or None
+
+    def queryset_filter(self):
+        """Equivalent ORM filter for the database fallback"""
+        return Q(**{f"{field}__in": codes for field, codes in self.filters.items()})
+
+
+def parse_query(text):
+    """
+    Map phrases like "short curly low maintenance" onto Style choice codes,
+    e.g. {"length": ["SHORT"], "texture": ["CURLY"], "maintenance": ["LOW"]}.
+    Several values for one field ("wavy or curly") are OR-ed together.
+    Negated phrases ("not curly") are dropped without adding a filter.
+    """
+    lowered = text.lower()
+    filters = {}
+    remainder = []
+    position = 0
+    for match in PATTERN.finditer(lowered):
+        before = lowered[position:match.start()]
+        position = match.end()
+        negated = NEGATION.search(before)
+        if negated:
+            remainder.append(before[:negated.start()])
+            continue
+        field, code = LOOKUP[match.group(1)]
+        codes = filters.setdefault(field, [])
+        if code not in codes:
+            codes.append(code)
+        remainder.append(before)
+    remainder.append(lowered[position:])
+
+    keywords = [word for word in " ".join(remainder).split() if word.strip(",.!?") not in STOPWORDS]
+    return ParsedQuery(text, filters, " ".join(keywords))
@@ -0,0 +1,265 @@
+import bisect
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .cache import get_catalog_version
+from .models import Style, StyleSearchDocument
+
+
+FTS_TABLE = "styles_search_fts"
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Casefolded words with accents removed, matching FTS5's remove_diacritics"""
+    decomposed = unicodedata.normalize("NFKD", (text or "").casefold())
+    return TOKEN_PATTERN.findall("".join(char for char in decomposed if not unicodedata.combining(char)))
+
+
+def build_document(title, stylist_name, description, tag_names):
+    """Text indexed for a style; tags go last so they rank like body text"""
+    return " ".join(part for part in [title, stylist_name, description, " ".join(tag_names)] if part)
+
+
+def update_search_documents(style_ids):
+    """Rebuild the search documents of the given styles; missing styles are skipped"""
+    styles = Style.objects.prefetch_related("tags").filter(id__in=style_ids)
+    documents = [
+        StyleSearchDocument(
+            style_id=style.id,
+            document=build_document(
+                style.title, style.stylist_name, style.description, [tag.name for tag in style.tags.all()]
+            ),
+        )
+        for style in styles
+    ]
+    # Deleted styles drop their document through the cascade
+    with transaction.atomic():
+        StyleSearchDocument.objects.filter(style_id__in=style_ids).delete()
+        StyleSearchDocument.objects.bulk_create(documents)
+
+
+class SearchIndex:
+    """Ranked keyword search over StyleSearchDocument"""
+
+    def search(self, text, limit):
+        """Return [(style_id, score)] for documents matching any word in text, best first"""
+        raise NotImplementedError
+
+
+class SQLiteFTSIndex(SearchIndex):
+    """
+    FTS5 table over styles_stylesearchdocument, kept in sync by triggers
+    (see migration 0006) and ranked with bm25.
+    """
+
+    def search(self, text, limit):
+        tokens = tokenize(text)
+        if not tokens:
+            return []
+        # Quote every word so user input is never parsed as FTS syntax; match prefixes
+        match = " OR ".join(f'"{token}"*' for token in tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, bm25({FTS_TABLE}) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s ORDER BY bm25({FTS_TABLE}) LIMIT %s",
+                [match, limit],
+            )
+            # bm25 is lower-is-better
+            return [(style_id, -rank) for style_id, rank in cursor.fetchall()]
+
+
+class MySQLFullTextIndex(SearchIndex):
+    """FULLTEXT index on the document column, natural language relevance"""
+
+    def search(self, text, limit):
+        tokens = tokenize(text)
+        if not tokens:
+            return []
+        table = StyleSearchDocument._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT style_id, MATCH(document) AGAINST (%s IN NATURAL LANGUAGE MODE) AS score "
+                f"FROM {table} WHERE MATCH(document) AGAINST (%s IN NATURAL LANGUAGE MODE) "
+                f"ORDER BY score DESC LIMIT %s",
+                [" ".join(tokens), " ".join(tokens), limit],
+            )
+            return [(style_id, float(score)) for style_id, score in cursor.fetchall()]
+
+
+class IndexSnapshot:
+    """Immutable postings of one PythonSearchIndex build, swapped in whole"""
+
+    __slots__ = ("postings", "terms", "lengths", "average_length", "version", "built_at")
+
+    def __init__(self, documents, version=None):
+        """documents: iterable of (style_id, text)"""
+        postings = defaultdict(dict)
+        lengths = {}
+        for style_id, text in documents:
+            counts = Counter(tokenize(text))
+            lengths[style_id] = sum(counts.values())
+            for term, count in counts.items():
+                postings[term][style_id] = count
+        self.postings = dict(postings)
+        self.terms = sorted(postings)
+        self.lengths = lengths
+        self.average_length = sum(lengths.values()) / len(lengths) if lengths else 0.0
+        self.version = version
+        self.built_at = time.monotonic()
+
+
+class PythonSearchIndex(SearchIndex):
+    """
+    In-process BM25 inverted index for databases without full-text support.
+    Built from StyleSearchDocument and rebuilt when the catalog version changes,
+    or every unversioned_ttl seconds while the version is unavailable.
+    """
+
+    k1 = 1.2
+    b = 0.75
+    max_expansions = 50
+    unversioned_ttl = 60
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def build(self, documents, version=None):
+        """Replace the index with one over documents, an iterable of (style_id, text)"""
+        self._snapshot = IndexSnapshot(documents, version)
+
+    def _is_current(self, snapshot, version):
+        if snapshot is None:
+            return False
+        if version is None:
+            return time.monotonic() - snapshot.built_at < self.unversioned_ttl
+        return snapshot.version == version
+
+    def _refresh(self):
+        """The current snapshot, rebuilt first if the catalog changed"""
+        version = get_catalog_version()
+        snapshot = self._snapshot
+        if self._is_current(snapshot, version):
+            return snapshot
+        with self._lock:
+            # Another thread may have rebuilt while this one waited
+            if not self._is_current(self._snapshot, version):
+                self.build(StyleSearchDocument.objects.values_list("style_id", "document").iterator(), version)
+            return self._snapshot
+
+    def _expand(self, terms, token):
+        # Prefix matching, like the quoted "token"* FTS5 query
+        start = bisect.bisect_left(terms, token)
+        expanded = []
+        for term in terms[start:start + self.max_expansions]:
+            if not term.startswith(token):
+                break
+            expanded.append(term)
+        return expanded
+
+    def search(self, text, limit):
+        # Work on one snapshot throughout; a concurrent rebuild swaps in a new one
+        snapshot = self._refresh()
+        total = len(snapshot.lengths)
+        scores = defaultdict(float)
+        for term in {term for token in set(tokenize(text)) for term in self._expand(snapshot.terms, token)}:
+            postings = snapshot.postings[term]
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for style_id, count in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * snapshot.lengths[style_id] / snapshot.average_length)
+                scores[style_id] += idf * count * (self.k1 + 1) / (count + norm)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+BACKENDS = {
+    "fts5": SQLiteFTSIndex,
+    "mysql": MySQLFullTextIndex,
+    "python": PythonSearchIndex,
+}
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+_fts5_tables = set()
+
+
+def _fts5_available():
+    # Only a positive answer is remembered, so running migrate later is picked up
+    if connection.alias not in _fts5_tables:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            if cursor.fetchone() is None:
+                return False
+        _fts5_tables.add(connection.alias)
+    return True
+
+
+def resolve_backend():
+    """Backend name for settings.LEXICAL_SEARCH_BACKEND, resolving "auto" by database vendor"""
+    name = settings.LEXICAL_SEARCH_BACKEND
+    if name != "auto":
+        return name
+    if connection.vendor == "sqlite" and _fts5_available():
+        return "fts5"
+    if connection.vendor == "mysql":
+        return "mysql"
+    return "python"
+
+
+def get_search_index():
+    """Shared SearchIndex instance for this process"""
+    name = resolve_backend()
+    with _indexes_lock:
+        if name not in _indexes:
+            try:
+                _indexes[name] = BACKENDS[name]()
+            except KeyError:
+                raise ValueError(f"Unknown lexical search backend: {name}")
+        return _indexes[name]
+
+
+def lexical_search(parsed, limit=50):
+    """
+    Ranked style ids for a parsed query: full-text matches on the leftover
+    keywords, restricted to the query's attribute filters. A query that is
+    only attribute filters returns the newest matching styles.
+    """
+    text = parsed.remainder or ("" if parsed.filters else parsed.text)
+    if not text:
+        styles = Style.objects.filter(parsed.queryset_filter()).order_by("-created_at", "-id")
+        return list(styles.values_list("id", flat=True)[:limit])
+
+    # Over-fetch when filters will discard some of the matches
+    ranked = get_search_index().search(text, limit * 5 if parsed.filters else limit)
+    style_ids = [style_id for style_id, _ in ranked]
+    if parsed.filters:
+        allowed = set(
+            Style.objects.filter(parsed.queryset_filter(), id__in=style_ids).values_list("id", flat=True)
+        )
+        style_ids = [style_id for style_id in style_ids if style_id in allowed]
+    return style_ids[:limit]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuse ranked lists of style ids: each list adds 1 / (k + rank) to a style's
+    score. rankings maps a source name ("vector", "text") to ids, best first.
+    Returns [{'style_id', 'score', 'sources'}] ordered by fused score.
+    """
+    fused = {}
+    for source, style_ids in rankings.items():
+        for rank, style_id in enumerate(style_ids, start=1):
+            # Pinecone returns numeric metadata as floats
+            entry = fused.setdefault(int(style_id), {'style_id': int(style_id), 'score': 0.0, 'sources': []})
+            if source not in entry['sources']:
+                entry['score'] += 1 / (k + rank)
+                entry['sources'].append(source)
+    return sorted(fused.values(), key=lambda entry: -entry['score'])
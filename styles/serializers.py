@@ -1,4 +1,5 @@
 from rest_framework import serializers, viewsets
+from django.core.files.storage import default_storage
 from django.shortcuts import render
 from taggit.serializers import TagListSerializerField, TaggitSerializer
 from .models import Style, Image
@@ -9,10 +10,11 @@ class ImageSerializer(serializers.ModelSerializer):
     type = serializers.CharField(source="get_type_display")
     view = serializers.CharField(source="get_view_display")
     photo_url = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Image
-        fields = "__all__"
+        exclude = ["derivatives"]
 
     def get_photo_url(self, obj):
         request = self.context.get('request')
@@ -22,6 +24,18 @@ class ImageSerializer(serializers.ModelSerializer):
             return obj.image.url
         return None
 
+    def get_srcset(self, obj):
+        """{format: "url 320w, url 640w, ..."} of the resized derivatives, empty until generated"""
+        request = self.context.get('request')
+        srcset = {}
+        for fmt, sizes in obj.derivatives.items():
+            candidates = []
+            for width, name in sorted(sizes.items(), key=lambda item: int(item[0])):
+                url = default_storage.url(name)
+                candidates.append(f"{request.build_absolute_uri(url) if request else url} {width}w")
+            srcset[fmt] = ", ".join(candidates)
+        return srcset
+
 
 class StyleSerializer(TaggitSerializer, serializers.ModelSerializer):
     style_image = ImageSerializer(many=True, read_only=True)
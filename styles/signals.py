@@ -1,23 +1,60 @@
-
-from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
-from .models import Style
-from .vector_search import VectorSearchService
+from taggit.models import Tag
+from .models import Style, Image
+from .derivatives import delete_derivatives, image_uploaded, is_shared
+from .indexing import style_changed, style_deleted, style_touched
 
 
 # Define the receiver
+# Index operations are written in the transaction that changed the style, one
+# pending row per style, and applied by `manage.py process_index_queue`
 @receiver(post_save, sender=Style)
 def styles_changed(sender, instance, **kwargs):
-    vector_service = VectorSearchService()
-    vector_service.index_style(instance)
+    style_changed(instance.id)
 
 @receiver(post_delete, sender=Style)
 def styles_deleted(sender, instance, **kwargs):
-    vector_service = VectorSearchService()
-    vector_service.delete_style(instance)
+    style_deleted(instance.id)
 
 @receiver(m2m_changed, sender=Style.tags.through)
 def tags_changed(sender, instance, action, **kwargs):
   if action in ['post_add', 'post_remove', 'post_clear']:
-      vector_service = VectorSearchService()
-      vector_service.index_style(instance)
+      style_changed(instance.id)
+
+# Renaming or deleting a tag changes the text of every style that uses it
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def tag_changed(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    for style_id in Style.objects.filter(tags=instance).values_list('id', flat=True):
+        style_changed(style_id)
+
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+def images_changed(sender, instance, **kwargs):
+    style_touched(instance.style_id)
+
+# Resized derivatives are rendered after commit when an image file is added or replaced
+@receiver(post_init, sender=Image)
+def remember_image_name(sender, instance, **kwargs):
+    # Read __dict__ directly: a deferred image field would cost a query
+    value = instance.__dict__.get('image')
+    instance._saved_image_name = getattr(value, 'name', value)
+
+@receiver(post_save, sender=Image)
+def image_file_changed(sender, instance, created, **kwargs):
+    if settings.IMAGE_DERIVATIVES_ON_UPLOAD and instance.image and (
+        created or instance.image.name != instance._saved_image_name
+    ):
+        image_uploaded(instance.id, instance._saved_image_name)
+    instance._saved_image_name = instance.image.name
+
+@receiver(post_delete, sender=Image)
+def image_deleted(sender, instance, **kwargs):
+    # Identical uploads share one hashed original and its derivatives
+    if instance.derivatives and not is_shared(instance.image.name, instance.pk):
+        transaction.on_commit(lambda: delete_derivatives(instance.derivatives))
@@ -0,0 +1,56 @@
+import hashlib
+import os
+import re
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+HASH_LENGTH = 12
+HASHED_NAME = re.compile(rf"\.[0-9a-f]{{{HASH_LENGTH}}}\.[^./]+$")
+
+
+def is_hashed_name(name):
+    """Whether a stored name carries a content hash, so its content never changes"""
+    return bool(HASHED_NAME.search(name))
+
+
+class HashedFileSystemStorage(FileSystemStorage):
+    """
+    FileSystemStorage that adds a hash of each file's content to its name,
+    e.g. styles/bob.3f9a1c02d4e5.jpg. A name never refers to different bytes,
+    so media URLs can be cached forever, and saving content that is already
+    stored returns the existing name.
+    """
+
+    def hashed_name(self, name, content, max_length=None):
+        hasher = hashlib.sha256()
+        for chunk in content.chunks():
+            hasher.update(chunk)
+        content.seek(0)
+        dir_name, file_name = os.path.split(name)
+        file_root, file_ext = os.path.splitext(file_name)
+        suffix = f".{hasher.hexdigest()[:HASH_LENGTH]}{file_ext}"
+        # Shorten the original root rather than letting Django cut into the hash
+        excess = len(os.path.join(dir_name, file_root + suffix)) - max_length if max_length else 0
+        if excess > 0:
+            file_root = file_root[:-excess]
+            if not file_root:
+                raise SuspiciousFileOperation(
+                    f'Storage can not find an available filename for "{name}". '
+                    "Please make sure that the corresponding file field "
+                    'allows sufficient "max_length".'
+                )
+        return os.path.join(dir_name, file_root + suffix)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        name = self.hashed_name(name, content, max_length)
+        # Same name, same bytes: keep the stored copy instead of saving a suffixed duplicate
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
@@ -1,3 +1,711 @@
-from django.test import TestCase
+import io
+import itertools
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import Http404
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image as PILImage
+from rest_framework.test import APIClient
+
+from .cache import EmbeddingCache
+from .derivatives import _save_derivatives
+from .imaging import analyze_bytes, render_derivatives
+from .neighbors import compute_neighbors, refresh_neighbors
+from .indexing import bulk_indexing
+from .models import IndexOperation, Style, StyleIndexEntry, StyleNeighbors, Image
+from .pagination import StyleCursorPagination
+from .query_parser import parse_query
+from .search_index import reciprocal_rank_fusion
+from .storage import HashedFileSystemStorage, is_hashed_name
+from .views import _fuse, serve_media
+from .vector_backends import LocalVectorBackend
+from .vector_search import VectorSearchService, embedding_key
+
+
+def create_styles(count):
+    styles = []
+    for i in range(count):
+        style = Style.objects.create(title=f"Style {i}", stylist_name="Sam")
+        style.tags.add("bob", f"tag-{i}")
+        Image.objects.create(style=style, image=f"styles/{i}.jpg", image_alt=f"Style {i}")
+        Image.objects.create(style=style, image=f"styles/{i}-side.jpg", image_alt=f"Style {i} side", view="SIDE")
+        styles.append(style)
+    return styles
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class StyleQueryCountTests(TestCase):
+    """Serializing styles must cost a constant number of queries, not one or more per style"""
+
+    def setUp(self):
+        self.client = APIClient()
+        caches[settings.FRAGMENT_CACHE_ALIAS].clear()
+
+    def count_queries(self, func):
+        with CaptureQueriesContext(connection) as context:
+            func()
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, func, small=2, large=12):
+        create_styles(small)
+        # Warm up one-off work such as seeding the catalog version
+        func()
+        small_count = self.count_queries(func)
+        create_styles(large - small)
+        large_count = self.count_queries(func)
+        self.assertEqual(small_count, large_count)
+        return large_count
+
+    def test_style_list(self):
+        def fetch():
+            response = self.client.get("/api/styles/")
+            self.assertEqual(response.status_code, 200)
+
+        # Page, count, images, tags and the catalog version for the ETag
+        self.assertLessEqual(self.assertConstantQueries(fetch), 5)
+
+    def test_favorites(self):
+        def fetch():
+            # Measure the fragment cache miss path
+            caches[settings.FRAGMENT_CACHE_ALIAS].clear()
+            ids = ",".join(str(pk) for pk in Style.objects.values_list("id", flat=True))
+            response = self.client.get(f"/api/favorites/?ids={ids}")
+            self.assertEqual(response.status_code, 200)
+
+        self.assertConstantQueries(fetch)
+
+    def test_vector_search(self):
+        service = mock.Mock()
+        service.generate_ai_response.return_value = "Try these"
+        # A distinct query per request so the search response cache never hits
+        queries = (f"bob {i}" for i in itertools.count())
+
+        def fetch():
+            caches[settings.FRAGMENT_CACHE_ALIAS].clear()
+            service.search_styles.return_value = [
+                {"style_id": pk, "score": 0.9, "metadata": {}}
+                for pk in Style.objects.values_list("id", flat=True)
+            ]
+            response = self.client.post("/api/styles/search/", {"query": next(queries)}, format="json")
+            self.assertEqual(response.status_code, 200)
+            # Search documents are written with the styles, so the "bob" tag matches the text index too
+            self.assertEqual(response.json()["search_method"], "hybrid")
+
+        with mock.patch("styles.views.get_vector_service", return_value=service):
+            self.assertConstantQueries(fetch)
+
+    def test_ai_prompt(self):
+        service = VectorSearchService.__new__(VectorSearchService)
+
+        def build():
+            service.build_ai_prompt("bob", list(Style.objects.with_related()))
+
+        self.assertConstantQueries(build)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class SearchCacheTests(TestCase):
+    """Responses degraded by an upstream failure must not be cached"""
+
+    def setUp(self):
+        self.client = APIClient()
+        caches[settings.SEARCH_CACHE_ALIAS].clear()
+        self.styles = create_styles(2)
+        self.service = mock.Mock()
+        self.service.search_styles.return_value = [
+            {"style_id": style.id, "score": 0.9, "metadata": {}} for style in self.styles
+        ]
+        self.service.generate_ai_response.return_value = "Try these"
+        self.service.fallback_ai_response.return_value = "Fallback"
+        patcher = mock.patch("styles.views.get_vector_service", return_value=self.service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def search(self):
+        response = self.client.post("/api/styles/search/", {"query": "bob"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def stream(self):
+        response = self.client.post("/api/styles/search/stream/", {"query": "bob"}, format="json")
+        events = b"".join(response.streaming_content).decode()
+        return json.loads(events.split("event: done\ndata: ")[1])["cache"]
+
+    def test_healthy_results_are_cached(self):
+        self.assertEqual(self.search()["X-Cache"], "MISS")
+        self.assertEqual(self.search()["X-Cache"], "HIT")
+
+    def test_failed_vector_search_is_not_cached(self):
+        self.service.search_styles.return_value = None
+        self.assertEqual(self.search().json()["search_method"], "text")
+        self.assertEqual(self.search()["X-Cache"], "MISS")
+
+    def test_failed_ai_response_is_not_cached(self):
+        self.service.generate_ai_response.return_value = None
+        self.assertEqual(self.search().json()["ai_response"], "Fallback")
+        self.assertEqual(self.search()["X-Cache"], "MISS")
+
+    def test_async_fallback_is_not_cached(self):
+        self.service.asearch_styles = mock.AsyncMock(return_value=self.service.search_styles.return_value)
+        self.service.agenerate_ai_response = mock.AsyncMock(return_value=None)
+
+        def search():
+            response = self.client.post("/api/styles/search/async/", {"query": "bob"}, format="json")
+            self.assertEqual(response.status_code, 200)
+            return response
+
+        self.assertEqual(search().json()["ai_response"], "Fallback")
+        self.assertEqual(search()["X-Cache"], "MISS")
+        self.service.agenerate_ai_response.return_value = "Try these"
+        self.assertEqual(search()["X-Cache"], "MISS")
+        self.assertEqual(search()["X-Cache"], "HIT")
+
+    def test_broken_stream_is_not_cached(self):
+        def broken(*args):
+            yield "Partial"
+            return False
+
+        self.service.stream_ai_response.side_effect = broken
+        self.assertEqual(self.stream(), "MISS")
+        self.assertEqual(self.stream(), "MISS")
+        self.service.stream_ai_response.side_effect = lambda *args: iter(["Complete"])
+        self.assertEqual(self.stream(), "MISS")
+        self.assertEqual(self.stream(), "HIT")
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class StyleListTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.styles = create_styles(3)
+        Style.objects.filter(pk=self.styles[1].pk).update(stylist_name="Alex", length="LONG")
+
+    def ids(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [result["id"] for result in response.json()["results"]]
+
+    def test_filters(self):
+        sam = [style.id for style in self.styles if style.id != self.styles[1].id]
+        self.assertCountEqual(self.ids(self.client.get("/api/styles/?stylist=sam")), sam)
+        self.assertEqual(self.ids(self.client.get("/api/styles/?stylist=ALEX&length=long")), [self.styles[1].id])
+        self.assertEqual(self.ids(self.client.get("/api/styles/?stylist=alex&length=short")), [])
+
+    @mock.patch.object(StyleCursorPagination, "page_size", 2)
+    def test_cursor_round_trip(self):
+        first = self.client.get("/api/styles/?pagination=cursor")
+        second = self.client.get(first.json()["next"])
+        self.assertIsNone(second.json()["next"])
+        self.assertCountEqual(self.ids(first) + self.ids(second), [style.id for style in self.styles])
+        self.assertEqual(self.ids(self.client.get(second.json()["previous"])), self.ids(first))
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class FacetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        caches[settings.SEARCH_CACHE_ALIAS].clear()
+        self.styles = create_styles(3)
+        Style.objects.filter(pk=self.styles[0].pk).update(length="SHORT", texture="CURLY")
+        Style.objects.filter(pk=self.styles[1].pk).update(length="LONG", texture="CURLY", stylist_name="Alex")
+        Style.objects.filter(pk=self.styles[2].pk).update(length="LONG", texture="STRAIGHT")
+
+    def facets(self, query=""):
+        response = self.client.get(f"/api/styles/facets/{query}")
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        counts = {
+            field: {item["value"]: item["count"] for item in items if item["count"]}
+            for field, items in payload["facets"].items()
+        }
+        return payload["total"], counts, response["X-Cache"]
+
+    def test_counts(self):
+        total, counts, _ = self.facets()
+        self.assertEqual(total, 3)
+        self.assertEqual(counts["length"], {"SHORT": 1, "LONG": 2})
+        self.assertEqual(counts["texture"], {"CURLY": 2, "STRAIGHT": 1})
+        self.assertEqual(counts["tags"], {"bob": 3, "tag-0": 1, "tag-1": 1, "tag-2": 1})
+
+    def test_a_facet_ignores_its_own_filter(self):
+        total, counts, _ = self.facets("?length=long&texture=curly")
+        self.assertEqual(total, 1)
+        # Other lengths of curly styles, other textures of long styles
+        self.assertEqual(counts["length"], {"SHORT": 1, "LONG": 1})
+        self.assertEqual(counts["texture"], {"CURLY": 1, "STRAIGHT": 1})
+        self.assertEqual(counts["tags"], {"bob": 1, "tag-1": 1})
+
+        total, counts, _ = self.facets("?stylist=sam&tags=tag-0,tag-2")
+        self.assertEqual(total, 2)
+        self.assertEqual(counts["tags"], {"bob": 2, "tag-0": 1, "tag-2": 1})
+
+    def test_invalid_filter(self):
+        response = self.client.get("/api/styles/facets/?length=bogus")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("length", response.json())
+
+    def test_counts_refresh_when_a_style_changes(self):
+        self.assertEqual(self.facets()[1]["length"], {"SHORT": 1, "LONG": 2})
+        self.assertEqual(self.facets()[2], "HIT")
+
+        style = self.styles[0]
+        style.length = "LONG"
+        with self.captureOnCommitCallbacks(execute=True):
+            style.save()
+
+        _, counts, cache_status = self.facets()
+        self.assertEqual(cache_status, "MISS")
+        self.assertEqual(counts["length"], {"LONG": 3})
+
+
+class StyleFragmentCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        caches[settings.FRAGMENT_CACHE_ALIAS].clear()
+
+    def fetch_favorites(self, styles):
+        ids = ",".join(str(style.id) for style in styles)
+        response = self.client.get(f"/api/favorites/?ids={ids}")
+        self.assertEqual(response.status_code, 200)
+        return response.json()["results"]
+
+    def test_cached_favorites_cost_one_query(self):
+        styles = create_styles(3)
+        expected = self.fetch_favorites(styles[::-1])
+        with CaptureQueriesContext(connection) as context:
+            results = self.fetch_favorites(styles[::-1])
+        # One style query; the other reads the catalog version for the ETag
+        self.assertEqual(len([query for query in context.captured_queries if "styles_" in query["sql"]]), 1)
+        self.assertEqual(len(context.captured_queries), 2)
+        self.assertEqual(results, expected)
+        self.assertEqual([result["id"] for result in results], [style.id for style in styles[::-1]])
+        self.assertTrue(results[0]["style_image"][0]["image"].startswith("http://testserver/"))
+
+    def test_image_change_invalidates_fragment(self):
+        style = create_styles(1)[0]
+        self.assertEqual(len(self.fetch_favorites([style])[0]["style_image"]), 2)
+
+        # Touches the style's updated_at, so its fragment misses
+        Image.objects.create(style=style, image="styles/extra.jpg", image_alt="Extra", view="BACK")
+        self.assertEqual(len(self.fetch_favorites([style])[0]["style_image"]), 3)
+
+
+class ImageProcessingTests(TestCase):
+    def encode(self, size, mode="RGB", fmt="JPEG", **options):
+        buffer = io.BytesIO()
+        PILImage.new(mode, size, "#c86432").save(buffer, fmt, **options)
+        return buffer.getvalue()
+
+    def test_widths_and_formats(self):
+        derivatives = render_derivatives(self.encode((2000, 1000)), [320, 640, 4000], ["webp", "jpeg"], 80)
+        self.assertEqual(set(derivatives), {"webp", "jpeg"})
+        for fmt, sizes in derivatives.items():
+            # Never upscaled past the original
+            self.assertEqual(sorted(sizes), [320, 640])
+            with PILImage.open(io.BytesIO(sizes[320])) as image:
+                self.assertEqual(image.size, (320, 160))
+                self.assertEqual(image.format, fmt.upper())
+
+    def test_small_original_keeps_its_size(self):
+        derivatives = render_derivatives(self.encode((200, 100), "RGBA", "PNG"), [320, 640], ["jpeg"], 80)
+        self.assertEqual(list(derivatives["jpeg"]), [200])
+
+    def test_preview(self):
+        exif = PILImage.Exif()
+        exif[0x0112] = 6  # rotated a quarter turn
+        preview = analyze_bytes(self.encode((1200, 800), exif=exif))
+        self.assertEqual((preview["width"], preview["height"]), (800, 1200))
+        self.assertRegex(preview["dominant_color"], r"^#c[0-9a-f]6[0-9a-f]3[0-9a-f]$")
+        self.assertTrue(preview["placeholder"].startswith("data:image/webp;base64,"))
+        self.assertLess(len(preview["placeholder"]), 500)
+
+    def test_replacing_a_shared_upload_keeps_its_derivatives(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        style = Style.objects.create(title="Bob", stylist_name="Sam")
+        data = self.encode((800, 400))
+        with override_settings(MEDIA_ROOT=media_root.name, IMAGE_DERIVATIVES_ON_UPLOAD=False):
+            first, second = [
+                Image.objects.create(style=style, image=SimpleUploadedFile("bob.jpg", data), image_alt="Bob")
+                for _ in range(2)
+            ]
+            # Both rows point at the one deduplicated original
+            self.assertEqual(first.image.name, second.image.name)
+            for image in (first, second):
+                _save_derivatives(image, render_derivatives(data, [320], ["jpeg"], 80))
+            shared = second.derivatives["jpeg"]["320"]
+            self.assertEqual(first.derivatives["jpeg"]["320"], shared)
+
+            previous = first.image.name
+            first.image = SimpleUploadedFile("lob.jpg", self.encode((800, 400), "L"))
+            first.save()
+            _save_derivatives(first, render_derivatives(first.image.read(), [320], ["jpeg"], 80), previous)
+
+            self.assertNotEqual(first.derivatives["jpeg"]["320"], shared)
+            self.assertTrue(default_storage.exists(shared))
+
+
+class ImageUploadHandlerTests(TestCase):
+    def upload(self, name, data, path="/admin/"):
+        request = RequestFactory().post(path, {"image": SimpleUploadedFile(name, data)})
+        return request.FILES.get("image")
+
+    def encode(self, size, fmt):
+        buffer = io.BytesIO()
+        PILImage.new("RGB", size).save(buffer, fmt)
+        return buffer.getvalue()
+
+    def test_accepts_images(self):
+        for name, fmt in [("a.jpg", "JPEG"), ("a.png", "PNG"), ("a.webp", "WEBP")]:
+            uploaded = self.upload(name, self.encode((40, 30), fmt))
+            self.assertIsNotNone(uploaded, name)
+
+    def test_rejects_other_files(self):
+        self.assertIsNone(self.upload("a.jpg", b"<html>" * 100))
+        self.assertIsNone(self.upload("a.gif", self.encode((40, 30), "GIF")))
+
+    @mock.patch("styles.uploads.messages.error")
+    def test_messages_only_in_admin(self, error):
+        self.assertIsNone(self.upload("a.gif", b"GIF89a", path="/api/styles/"))
+        error.assert_not_called()
+        self.assertIsNone(self.upload("a.gif", b"GIF89a"))
+        error.assert_called_once()
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=1000)
+    def test_rejects_large_dimensions(self):
+        self.assertIsNone(self.upload("a.png", self.encode((40, 30), "PNG")))
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name, MEDIA_SERVE_MODE="django")
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.name = HashedFileSystemStorage(location=media_root.name).save("styles/bob.jpg", ContentFile(b"0123456789"))
+
+    def get(self, path, **headers):
+        return serve_media(RequestFactory().get(f"/media/{path}", **headers), path)
+
+    def test_hashed_names(self):
+        self.assertRegex(self.name, r"^styles/bob\.[0-9a-f]{12}\.jpg$")
+        self.assertTrue(is_hashed_name(self.name))
+        self.assertFalse(is_hashed_name("styles/bob.jpg"))
+
+    def test_identical_content_is_stored_once(self):
+        storage = HashedFileSystemStorage(location=settings.MEDIA_ROOT)
+        self.assertEqual(storage.save("styles/bob.jpg", ContentFile(b"0123456789")), self.name)
+        self.assertEqual(len(os.listdir(os.path.join(settings.MEDIA_ROOT, "styles"))), 1)
+
+    def test_max_length_keeps_the_hash(self):
+        storage = HashedFileSystemStorage(location=settings.MEDIA_ROOT)
+        name = storage.save("styles/" + "b" * 60 + ".jpg", ContentFile(b"other"), max_length=40)
+        self.assertEqual(len(name), 40)
+        self.assertTrue(is_hashed_name(name))
+
+    def test_full_and_conditional(self):
+        response = self.get(self.name)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(self.get(self.name, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+    def test_ranges(self):
+        response = self.get(self.name, HTTP_RANGE="bytes=2-5")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(b"".join(response.streaming_content), b"2345")
+        self.assertEqual(b"".join(self.get(self.name, HTTP_RANGE="bytes=-3").streaming_content), b"789")
+        self.assertEqual(self.get(self.name, HTTP_RANGE="bytes=10-").status_code, 416)
+        # A stale If-Range gets the whole file
+        self.assertEqual(self.get(self.name, HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE='"stale"').status_code, 200)
+
+    def test_outside_media_root(self):
+        with self.assertRaises(Http404):
+            self.get("../settings.py")
+
+    def test_offloaded(self):
+        with override_settings(MEDIA_SERVE_MODE="x-accel", MEDIA_INTERNAL_URL="/protected-media/"):
+            response = self.get(self.name)
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.name}")
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.styles = create_styles(2)
+
+    def assertRevalidates(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        # Only the catalog version is read, never the style tables
+        self.assertFalse([query for query in context.captured_queries if "styles_" in query["sql"]])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.styles[0].title = "Renamed"
+            self.styles[0].save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_style_list(self):
+        self.assertRevalidates("/api/styles/?texture=straight")
+
+    def test_style_detail(self):
+        self.assertRevalidates(f"/api/styles/{self.styles[1].id}/")
+
+    def test_favorites(self):
+        self.assertRevalidates(f"/api/favorites/?ids={self.styles[1].id},{self.styles[0].id}")
+
+
+class IndexOutboxTests(TestCase):
+    def operations(self):
+        return list(IndexOperation.objects.order_by("id").values_list("style_id", "action"))
+
+    def test_queued_inside_the_transaction(self):
+        style = Style.objects.create(title="Bob", stylist_name="Sam")
+        style.tags.add("bob")
+        style.title = "Long bob"
+        style.save()
+        # Written before commit, and once per style however often it changes
+        self.assertEqual(self.operations(), [(style.id, "INDEX")])
+
+        style_id = style.id
+        style.delete()
+        self.assertEqual(self.operations(), [(style_id, "DELETE")])
+
+    def test_claimed_operations_are_not_rewritten(self):
+        style = Style.objects.create(title="Bob", stylist_name="Sam")
+        IndexOperation.objects.update(available_at=timezone.now() + timedelta(minutes=5))
+        style.save()
+        self.assertEqual(self.operations(), [(style.id, "INDEX"), (style.id, "INDEX")])
+
+    def test_rollback_drops_collected_changes(self):
+        with self.assertRaises(ValueError):
+            with transaction.atomic(), bulk_indexing():
+                Style.objects.create(title="Rolled back", stylist_name="Sam")
+                raise ValueError
+        with bulk_indexing():
+            style = Style.objects.create(title="Kept", stylist_name="Sam")
+        self.assertEqual(self.operations(), [(style.id, "INDEX")])
+
+
+class LocalVectorBackendTests(TestCase):
+    def setUp(self):
+        path = tempfile.TemporaryDirectory()
+        self.addCleanup(path.cleanup)
+        self.path = path.name
+        self.writer = LocalVectorBackend(self.path, "float32")
+        self.reader = LocalVectorBackend(self.path, "float32")
+        self.writer.upsert([("style_1", [1, 0, 0], {"tags": ["bob"]}), ("style_2", [0, 1, 0], {})])
+
+    def ids(self, backend, vector):
+        return [match["id"] for match in backend.query(vector, top_k=3)["matches"]]
+
+    def test_changes_are_logged_not_rewritten(self):
+        self.reader.query([1, 0, 0])
+        manifest = os.stat(os.path.join(self.path, "manifest.json")).st_ino
+        self.writer.upsert([("style_3", [0, 0, 1], {}), ("style_1", [0, 1, 0], {"tags": ["lob"]})])
+        self.writer.delete(["style_2"])
+
+        self.assertEqual(os.stat(os.path.join(self.path, "manifest.json")).st_ino, manifest)
+        self.assertEqual(self.ids(self.reader, [0, 1, 0]), ["style_1", "style_3"])
+        self.assertEqual(self.reader.query([0, 1, 0], top_k=1)["matches"][0]["metadata"], {"tags": ["lob"]})
+
+    def test_compact_folds_the_log(self):
+        self.writer.delete(["style_1"])
+        self.reader.compact()
+        self.assertEqual(self.writer.stats()["deleted_vector_count"], 0)
+        self.assertEqual(list(LocalVectorBackend(self.path, "float32").list_ids()), [["style_2"]])
+        self.assertEqual(len([name for name in os.listdir(self.path) if name.startswith("log.")]), 1)
+
+
+class IndexSyncTests(TestCase):
+    def setUp(self):
+        path = tempfile.TemporaryDirectory()
+        self.addCleanup(path.cleanup)
+        self.service = VectorSearchService.__new__(VectorSearchService)
+        self.service.backend = LocalVectorBackend(path.name, "float32")
+        self.service.generate_embeddings = mock.Mock(
+            side_effect=lambda texts: [[1.0, len(text) % 7, 0.5] for text in texts]
+        )
+        self.styles = create_styles(3)
+
+    def index_styles(self, *args):
+        out = io.StringIO()
+        with mock.patch("styles.management.commands.index_styles.get_vector_service", return_value=self.service):
+            call_command("index_styles", *args, stdout=out)
+        return out.getvalue()
+
+    def test_tag_order_is_stable(self):
+        style = self.styles[0]
+        style.tags.add("zeta", "alpha")
+        self.assertEqual(self.service.build_metadata(style)["tags"], ["alpha", "bob", "tag-0", "zeta"])
+
+    def test_unchanged_styles_are_skipped(self):
+        self.assertIn("3 styles indexed, 0 unchanged", self.index_styles())
+        self.assertIn("0 styles indexed, 3 unchanged", self.index_styles())
+        self.assertEqual(self.service.generate_embeddings.call_count, 1)
+
+        Style.objects.filter(pk=self.styles[1].pk).update(title="Renamed")
+        self.assertIn("1 styles indexed, 2 unchanged", self.index_styles())
+        self.assertEqual(self.service.generate_embeddings.call_args.args[0][0][:7], "Renamed")
+
+    def test_reconcile(self):
+        self.index_styles()
+        missing = self.styles[1].id
+        self.service.backend.delete([f"style_{missing}"])
+        self.service.backend.upsert([("style_999999", [0.0, 1.0, 0.0], {"style_id": 999999})])
+
+        output = self.index_styles("--reconcile")
+        self.assertIn("Deleted 1 orphaned vectors, 1 styles missing from the index", output)
+        self.assertIn("1 styles indexed, 2 unchanged", output)
+        ids = [vector_id for page in self.service.backend.list_ids() for vector_id in page]
+        self.assertCountEqual(ids, [f"style_{style.id}" for style in self.styles])
+
+
+class EmbeddingCacheTests(TestCase):
+    def test_counters(self):
+        # The in-memory cache as the shared tier, so the threads need no database
+        cache = EmbeddingCache(alias="default", max_entries=10)
+        caches["default"].clear()
+        cache.set("model", "bob", [1.0, 2.0])
+        cache.clear_local()
+        self.assertEqual(cache.get_many("model", ["bob", "lob"]), {"bob": [1.0, 2.0]})
+        self.assertEqual(cache.get("model", "bob"), [1.0, 2.0])
+
+        threads = [threading.Thread(target=cache.get_many, args=("model", [f"lob {i}" for i in range(50)])) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = cache.stats()
+        self.assertEqual((stats["local_hits"], stats["shared_hits"], stats["misses"]), (1, 1, 401))
+        self.assertIn("1 local hits, 1 shared hits, 401 misses", cache.summary())
+
+
+class QueryParserTests(TestCase):
+    CASES = [
+        ("short curly low maintenance", {"length": ["SHORT"], "texture": ["CURLY"], "maintenance": ["LOW"]}, ""),
+        ("wavy or curly bob", {"texture": ["WAVY", "CURLY"]}, "bob"),
+        ("medium", {"length": ["MEDIUM"]}, ""),
+        ("medium thick hair", {"thickness": ["MEDIUM"]}, ""),
+        ("medium maintenance", {"maintenance": ["MEDIUM"]}, ""),
+        ("medium length medium maintenance", {"length": ["MEDIUM"], "maintenance": ["MEDIUM"]}, ""),
+        ("long hair for a round face", {"length": ["LONG"], "face_shape": ["ROUND"]}, ""),
+        ("heart-shaped face", {"face_shape": ["HEART"]}, ""),
+        ("round layers", {}, "round layers"),
+        ("non-binary", {"gender": ["OTHER"]}, ""),
+        ("Blonde balayage!", {}, "blonde balayage!"),
+        ("I want a shag with curtain bangs", {}, "shag curtain bangs"),
+        ("longer layers", {}, "longer layers"),
+        ("", {}, ""),
+        ("not curly", {}, ""),
+        ("short hair without curls", {"length": ["SHORT"]}, ""),
+        ("no bangs, not long", {}, "no bangs,"),
+    ]
+
+    def test_parse_query(self):
+        for query, filters, remainder in self.CASES:
+            with self.subTest(query=query):
+                parsed = parse_query(query)
+                self.assertEqual(parsed.filters, filters)
+                self.assertEqual(parsed.remainder, remainder)
+
+
+class RankFusionTests(TestCase):
+    def ranking(self, fused):
+        return [(entry["style_id"], entry["sources"]) for entry in fused]
+
+    def test_overlapping_lists(self):
+        fused = reciprocal_rank_fusion({"vector": [1, 2, 3], "text": [3, 1]})
+        self.assertEqual(self.ranking(fused), [(1, ["vector", "text"]), (3, ["vector", "text"]), (2, ["vector"])])
+        self.assertAlmostEqual(fused[0]["score"], 1 / 61 + 1 / 62)
+
+    def test_disjoint_lists(self):
+        # Equal ranks tie; the vector ranking is listed first
+        fused = reciprocal_rank_fusion({"vector": [1, 2], "text": [3, 4]})
+        self.assertEqual(self.ranking(fused), [(1, ["vector"]), (3, ["text"]), (2, ["vector"]), (4, ["text"])])
+
+    def test_k(self):
+        # A small k favours top ranks, a large one favours agreement between sources
+        rankings = {"vector": [1, 5, 2], "text": [6, 7, 2]}
+        self.assertEqual(reciprocal_rank_fusion(rankings, k=0)[0]["style_id"], 1)
+        self.assertEqual(reciprocal_rank_fusion(rankings)[0]["style_id"], 2)
+
+    def test_ids_counted_once_per_source(self):
+        fused = reciprocal_rank_fusion({"vector": [1.0, 1], "text": []})
+        self.assertEqual(self.ranking(fused), [(1, ["vector"])])
+        self.assertAlmostEqual(fused[0]["score"], 1 / 61)
+
+    def test_search_method(self):
+        vector_results = [{"style_id": 1.0}, {"style_id": 2.0}]
+        self.assertEqual(_fuse(vector_results, [2, 3])[1], "hybrid")
+        self.assertEqual(_fuse(vector_results, [])[1], "vector")
+        self.assertEqual(_fuse([], [2, 3])[1], "text")
+        self.assertEqual(_fuse([], []), ([], "text"))
+
+        results, search_method = _fuse([], [2, 3])
+        self.assertEqual(self.ranking(results), [(2, ["text"]), (3, ["text"])])
+
+
+class NeighborRefreshTests(TestCase):
+    def setUp(self):
+        self.random = np.random.default_rng(7)
+        self.styles = create_styles(12)
+        for style in self.styles:
+            self.set_vector(style, self.random.normal(size=8))
+        compute_neighbors(count=3)
+
+    def set_vector(self, style, values):
+        entry = StyleIndexEntry(style=style, content_hash="hash")
+        entry.set_vector(values, embedding_key())
+        entry.save()
+
+    def neighbors(self):
+        return {row.style_id: (row.neighbor_ids, row.scores) for row in StyleNeighbors.objects.all()}
+
+    def assert_matches_full_recompute(self, changed_ids):
+        refresh_neighbors(changed_ids, count=3)
+        refreshed = self.neighbors()
+        compute_neighbors(count=3)
+        self.assertEqual(refreshed, self.neighbors())
+
+    def test_changed_vector(self):
+        # Move one style next to another, out of its old neighbors' lists
+        close = StyleIndexEntry.objects.get(style=self.styles[0]).get_vector() + self.random.normal(scale=0.01, size=8)
+        self.set_vector(self.styles[5], close)
+        self.assertNotEqual(self.neighbors()[self.styles[0].id][0][0], self.styles[5].id)
+        self.assert_matches_full_recompute([self.styles[5].id])
+        self.assertEqual(self.neighbors()[self.styles[0].id][0][0], self.styles[5].id)
+
+    def test_deleted_style(self):
+        deleted = self.styles[3].id
+        self.assertTrue(any(deleted in neighbor_ids for neighbor_ids, _ in self.neighbors().values()))
+        self.styles[3].delete()
+        self.assert_matches_full_recompute([deleted])
+        self.assertFalse(any(deleted in neighbor_ids for neighbor_ids, _ in self.neighbors().values()))
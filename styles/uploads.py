@@ -0,0 +1,67 @@
+import os
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.urls import reverse
+from PIL import Image as PILImage
+
+from .imaging import header_size, sniff_format
+from .models import IMAGE_EXTENSIONS, MAX_IMAGE_SIZE_MB
+
+
+# Bytes searched for the image size; JPEG EXIF and ICC segments come first
+HEADER_LIMIT = 512 * 1024
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """
+    Reject uploaded files that are not JPEG, PNG or WebP images, exceed
+    MAX_IMAGE_SIZE_MB or have more than IMAGE_UPLOAD_MAX_PIXELS, as soon as
+    the first chunks show it instead of after buffering the whole file.
+
+    Must come first in FILE_UPLOAD_HANDLERS; chunks are passed on unchanged
+    to the memory or temporary file handlers that store them.
+    """
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.head = b""
+        self.checked = False
+        ext = os.path.splitext(file_name)[1].lower()
+        if ext not in IMAGE_EXTENSIONS:
+            self.reject(f"unsupported file extension {ext}")
+
+    def reject(self, reason):
+        # Only the admin shows messages; API clients just get the field error
+        if self.request.path.startswith(reverse("admin:index")):
+            messages.error(self.request, f"Upload {self.file_name} rejected: {reason}", fail_silently=True)
+        raise SkipFile(reason)
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > MAX_IMAGE_SIZE_MB * 1024 * 1024:
+            self.reject(f"larger than {MAX_IMAGE_SIZE_MB}MB")
+        if not self.checked:
+            self.head += raw_data[:HEADER_LIMIT - len(self.head)]
+            self.check_header()
+        return raw_data
+
+    def check_header(self):
+        if len(self.head) >= 12 and sniff_format(self.head) is None:
+            self.reject("not a JPEG, PNG or WebP image")
+        try:
+            size = header_size(self.head)
+        except PILImage.DecompressionBombError:
+            self.reject("image dimensions too large")
+        if size is None:
+            if len(self.head) >= HEADER_LIMIT:
+                self.reject("image header not found")
+            return
+        width, height = size
+        if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+            self.reject(f"{width}x{height} image has more than {settings.IMAGE_UPLOAD_MAX_PIXELS} pixels")
+        self.checked = True
+
+    def file_complete(self, file_size):
+        # Storing the file is left to the handlers after this one
+        return None
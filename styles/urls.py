@@ -1,6 +1,6 @@
 from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
-from .views import StyleViewSet, FavoritesViewSet, search_styles
+from .views import StyleViewSet, FavoritesViewSet, search_styles, search_styles_async, search_styles_stream
 
 
 router = DefaultRouter()
@@ -9,6 +9,8 @@ router.register(r"favorites", FavoritesViewSet, basename='favorites')
 
 urlpatterns = [
     path("styles/search/", search_styles, name="search_styles"),
+    path("styles/search/async/", search_styles_async, name="search_styles_async"),
+    path("styles/search/stream/", search_styles_stream, name="search_styles_stream"),
     path("", include(router.urls)),
 ]
 
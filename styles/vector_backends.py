@@ -0,0 +1,538 @@
+import asyncio
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+
+
+class VectorBackend:
+    """
+    Storage and nearest-neighbour search for style vectors.
+
+    Vectors are upserted as (id, values, metadata) tuples. query() returns
+    {'matches': [{'id', 'score', 'metadata'}, ...]} ordered by descending
+    cosine similarity; filter uses Pinecone's metadata filter syntax.
+    """
+
+    def upsert(self, vectors):
+        raise NotImplementedError
+
+    def delete(self, ids):
+        raise NotImplementedError
+
+    def query(self, vector, top_k=10, filter=None, include_metadata=True):
+        raise NotImplementedError
+
+    def list_ids(self, page_size=100):
+        """Yield pages (lists) of every vector id in the index"""
+        raise NotImplementedError
+
+    async def aquery(self, vector, top_k=10, filter=None, include_metadata=True):
+        """Async query; runs the blocking query in a worker thread unless overridden"""
+        return await asyncio.to_thread(self.query, vector, top_k, filter, include_metadata)
+
+    def stats(self):
+        raise NotImplementedError
+
+
+class PineconeBackend(VectorBackend):
+    """Adapter for a Pinecone index"""
+
+    def __init__(self, index_name=None, pool_size=None):
+        from pinecone import Pinecone
+
+        # Indexes inherit the client's HTTP pool size and request timeout
+        self.pc = Pinecone(
+            api_key=os.getenv('PINECONE_API_KEY'),
+            connection_pool_maxsize=pool_size or settings.VECTOR_SEARCH_POOL_SIZE,
+            timeout=settings.PINECONE_TIMEOUT,
+        )
+        self.index = self.pc.Index(index_name or os.getenv('PINECONE_INDEX_NAME'))
+
+    def upsert(self, vectors):
+        self.index.upsert(vectors=list(vectors))
+
+    def delete(self, ids):
+        self.index.delete(ids=list(ids))
+
+    def query(self, vector, top_k=10, filter=None, include_metadata=True):
+        results = self.index.query(
+            vector=vector,
+            top_k=top_k,
+            filter=filter or None,
+            include_metadata=include_metadata
+        )
+        return {
+            'matches': [
+                {'id': match['id'], 'score': match['score'], 'metadata': match.get('metadata') or {}}
+                for match in results['matches']
+            ]
+        }
+
+    def list_ids(self, page_size=100):
+        # Paginated listing is only available on serverless indexes (max 100 per page)
+        for page in self.index.list(prefix='style_', limit=min(page_size, 100)):
+            yield [item.id for item in page.vectors]
+
+    def stats(self):
+        stats = self.index.describe_index_stats()
+        return stats.to_dict() if hasattr(stats, 'to_dict') else dict(stats)
+
+
+class _Snapshot:
+    """Immutable view of the local index as of one manifest generation and log offset"""
+
+    def __init__(self, manifest, matrix, log_offset=0):
+        self.manifest = manifest
+        self.matrix = matrix
+        # Bytes of the change log already folded into manifest
+        self.log_offset = log_offset
+        # Per-row dequantization factors for int8 indexes
+        scales = manifest.get('scales')
+        self.scales = np.asarray(scales, dtype=np.float32) if scales else None
+        self.columns = {}
+        self._row_of = None
+
+    @property
+    def row_of(self):
+        """Row of each live vector id"""
+        if self._row_of is None:
+            self._row_of = {
+                vector_id: row for row, vector_id in enumerate(self.manifest['ids']) if vector_id is not None
+            }
+        return self._row_of
+
+
+class LocalVectorBackend(VectorBackend):
+    """
+    In-process index of L2-normalized float32 vectors in a memory-mapped file.
+
+    Every worker maps the same file, so the OS page cache holds one copy of
+    the matrix. With dtype="int8" each row is quantized to signed bytes with
+    its own scale, a quarter of the memory at a small cost in score accuracy;
+    the type is fixed when the index is created. A JSON manifest lists ids,
+    metadata, row scales and deleted rows as of its generation; later upserts
+    and deletes are appended to that generation's change log, so a write costs
+    the size of its batch. Writers take an exclusive file lock and update rows
+    in place; the manifest is only replaced when the matrix grows or compact()
+    folds in the log and drops deleted rows. Readers replay new log lines on
+    their next query.
+    """
+
+    manifest_name = 'manifest.json'
+
+    dtypes = {'float32': 'f32', 'int8': 'i8'}
+
+    def __init__(self, path=None, dtype=None):
+        self.path = str(path or settings.VECTOR_LOCAL_PATH)
+        self.dtype = dtype or settings.VECTOR_LOCAL_DTYPE
+        if self.dtype not in self.dtypes:
+            raise ValueError(f"Unsupported local vector dtype '{self.dtype}'. Choose from: {', '.join(self.dtypes)}")
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._version = None
+        self._snapshot = _Snapshot(self._empty_manifest(), None)
+
+    # Storage
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _empty_manifest(self):
+        return {
+            'generation': 0,
+            'dimension': None,
+            'dtype': self.dtype,
+            'capacity': 0,
+            'count': 0,
+            'vectors_file': None,
+            'log_file': None,
+            'ids': [],
+            'metadata': [],
+            'scales': [],
+            'deleted': [],
+        }
+
+    def _read_manifest(self):
+        try:
+            with open(self._file(self.manifest_name)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return self._empty_manifest()
+
+    def _read_log(self, manifest, offset):
+        """(entries, new offset) for the complete log lines after offset"""
+        if not manifest.get('log_file'):
+            return [], offset
+        try:
+            with open(self._file(manifest['log_file']), 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return [], offset
+        # A writer that crashed mid-line leaves a partial entry; it is ignored
+        end = data.rfind(b'\n') + 1
+        return [json.loads(line) for line in data[:end].splitlines()], offset + end
+
+    @staticmethod
+    def _apply(manifest, entries):
+        """Copy of manifest with log entries applied"""
+        manifest = dict(
+            manifest,
+            ids=list(manifest['ids']),
+            metadata=list(manifest['metadata']),
+            scales=list(manifest.get('scales') or []),
+            deleted=list(manifest['deleted']),
+        )
+        for entry in entries:
+            if 'deleted' in entry:
+                for row in entry['deleted']:
+                    manifest['ids'][row] = None
+                    manifest['metadata'][row] = None
+                manifest['deleted'] = sorted(set(manifest['deleted']).union(entry['deleted']))
+                continue
+            scales = entry.get('scales')
+            for position, row in enumerate(entry['rows']):
+                if row == len(manifest['ids']):
+                    manifest['ids'].append(entry['ids'][position])
+                    manifest['metadata'].append(entry['metadata'][position])
+                    if scales:
+                        manifest['scales'].append(scales[position])
+                else:
+                    manifest['ids'][row] = entry['ids'][position]
+                    manifest['metadata'][row] = entry['metadata'][position]
+                    if scales:
+                        manifest['scales'][row] = scales[position]
+        manifest['count'] = len(manifest['ids'])
+        return manifest
+
+    def _map(self, manifest, mode='r'):
+        if not manifest['vectors_file'] or not manifest['capacity']:
+            return None
+        return np.memmap(
+            self._file(manifest['vectors_file']),
+            dtype=manifest.get('dtype', 'float32'),
+            mode=mode,
+            shape=(manifest['capacity'], manifest['dimension']),
+        )
+
+    def _manifest_version(self):
+        try:
+            stat = os.stat(self._file(self.manifest_name))
+        except FileNotFoundError:
+            return None
+        # The manifest is replaced, never rewritten, so a new inode means a new generation
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def _is_current(self, snapshot):
+        if self._manifest_version() != self._version:
+            return False
+        log_file = snapshot.manifest.get('log_file')
+        if not log_file:
+            return True
+        try:
+            return os.stat(self._file(log_file)).st_size == snapshot.log_offset
+        except FileNotFoundError:
+            return True
+
+    def _refresh(self):
+        """Bring the snapshot up to date with the files; the caller holds both locks"""
+        version = self._manifest_version()
+        snapshot = self._snapshot
+        if version != self._version:
+            manifest = self._read_manifest()
+            snapshot = _Snapshot(manifest, self._map(manifest))
+            self._version = version
+        entries, offset = self._read_log(snapshot.manifest, snapshot.log_offset)
+        if entries:
+            snapshot = _Snapshot(self._apply(snapshot.manifest, entries), snapshot.matrix, offset)
+        self._snapshot = snapshot
+        return snapshot
+
+    def _current(self):
+        """Snapshot for the files on disk, reloaded only when they changed"""
+        snapshot = self._snapshot
+        if self._is_current(snapshot):
+            return snapshot
+        with self._lock, self._file_lock(fcntl.LOCK_SH):
+            # Shared with other readers; keeps writers from removing files while they are mapped
+            return self._refresh()
+
+    @contextmanager
+    def _file_lock(self, operation):
+        with open(self._file('.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _write_lock(self):
+        """Exclusive across processes; yields the up-to-date snapshot"""
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            yield self._refresh()
+
+    def _save(self, manifest):
+        """Replace the manifest, starting an empty change log; returns the old log file"""
+        old_log = manifest.get('log_file')
+        manifest['generation'] += 1
+        manifest['log_file'] = f"log.{manifest['generation']}.jsonl"
+        open(self._file(manifest['log_file']), 'wb').close()
+        tmp_path = self._file(f'{self.manifest_name}.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._file(self.manifest_name))
+        return old_log
+
+    def _append(self, snapshot, entry):
+        """Record a change in the current generation's log"""
+        if not snapshot.manifest.get('log_file'):
+            # Index written before change logs; fold the change into a new manifest
+            self._save(self._apply(snapshot.manifest, [entry]))
+            return
+        with open(self._file(snapshot.manifest['log_file']), 'ab') as f:
+            # Drop a partial line left by a crashed writer before appending
+            f.truncate(snapshot.log_offset)
+            f.write(json.dumps(entry).encode() + b'\n')
+
+    def _allocate(self, manifest, capacity, rows):
+        """Copy rows of the current matrix into a new file with the given capacity"""
+        source = self._map(manifest)
+        dtype = manifest.get('dtype', 'float32')
+        name = f"vectors.{manifest['generation'] + 1}.{self.dtypes[dtype]}"
+        matrix = np.memmap(self._file(name), dtype=dtype, mode='w+', shape=(capacity, manifest['dimension']))
+        if len(rows):
+            matrix[:len(rows)] = source[rows]
+        old_file = manifest['vectors_file']
+        manifest['vectors_file'] = name
+        manifest['capacity'] = capacity
+        return matrix, old_file
+
+    def _remove(self, *names):
+        # Called under the exclusive lock, so no reader is between reading the
+        # manifest and mapping its files; readers that already mapped the old
+        # matrix keep the inode alive until they remap
+        for name in names:
+            if name:
+                os.remove(self._file(name))
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    @staticmethod
+    def _quantize(vectors):
+        """Symmetric per-row int8 quantization: returns (int8 rows, float scales)"""
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales
+
+    # VectorBackend API
+
+    def upsert(self, vectors):
+        vectors = list(vectors)
+        if not vectors:
+            return
+
+        values = self._normalize([vector[1] for vector in vectors])
+        with self._write_lock() as snapshot:
+            dimension = snapshot.manifest['dimension']
+            if dimension is not None and dimension != values.shape[1]:
+                raise ValueError(
+                    f"Vector dimension {values.shape[1]} does not match index dimension {dimension}"
+                )
+
+            entry = {'rows': [], 'ids': [], 'metadata': []}
+            if snapshot.manifest.get('dtype', 'float32') == 'int8':
+                values, scales = self._quantize(values)
+                entry['scales'] = [float(scale) for scale in scales]
+
+            previous_count = snapshot.manifest['count']
+            added = {}
+            for vector_id, _, metadata in vectors:
+                row = snapshot.row_of.get(vector_id, added.get(vector_id))
+                if row is None:
+                    row = added[vector_id] = previous_count + len(added)
+                entry['rows'].append(row)
+                entry['ids'].append(vector_id)
+                entry['metadata'].append(metadata)
+
+            count = previous_count + len(added)
+            if count > snapshot.manifest['capacity']:
+                # Growing copies the matrix anyway, so fold the log into a new manifest
+                manifest = self._apply(snapshot.manifest, [entry])
+                manifest['dimension'] = values.shape[1]
+                capacity = max(1024, manifest['capacity'] * 2, count)
+                matrix, old_file = self._allocate(manifest, capacity, np.arange(previous_count))
+                matrix[entry['rows']] = values
+                matrix.flush()
+                self._remove(old_file, self._save(manifest))
+            else:
+                matrix = self._map(snapshot.manifest, mode='r+')
+                matrix[entry['rows']] = values
+                matrix.flush()
+                self._append(snapshot, entry)
+
+    def delete(self, ids):
+        with self._write_lock() as snapshot:
+            rows = sorted({snapshot.row_of[vector_id] for vector_id in ids if vector_id in snapshot.row_of})
+            if rows:
+                self._append(snapshot, {'deleted': rows})
+
+    def compact(self):
+        """Fold the change log into a new manifest and rewrite the matrix without deleted rows"""
+        with self._write_lock() as snapshot:
+            if not snapshot.log_offset and not snapshot.manifest['deleted']:
+                return
+            manifest = self._apply(snapshot.manifest, [])
+            old_file = None
+            if manifest['deleted']:
+                deleted = set(manifest['deleted'])
+                live_rows = np.array([row for row in range(manifest['count']) if row not in deleted], dtype=np.int64)
+                matrix, old_file = self._allocate(manifest, max(1024, len(live_rows)), live_rows)
+                matrix.flush()
+                manifest['ids'] = [manifest['ids'][row] for row in live_rows]
+                manifest['metadata'] = [manifest['metadata'][row] for row in live_rows]
+                if manifest.get('scales'):
+                    manifest['scales'] = [manifest['scales'][row] for row in live_rows]
+                manifest['count'] = len(live_rows)
+                manifest['deleted'] = []
+            self._remove(old_file, self._save(manifest))
+
+    def query(self, vector, top_k=10, filter=None, include_metadata=True):
+        snapshot = self._current()
+        manifest = snapshot.manifest
+        count = manifest['count']
+        if not count or snapshot.matrix is None:
+            return {'matches': []}
+
+        mask = self._filter_mask(snapshot, filter)
+        if manifest['deleted']:
+            mask[manifest['deleted']] = False
+
+        k = min(top_k, int(mask.sum()))
+        if not k:
+            return {'matches': []}
+
+        scores = snapshot.matrix[:count] @ self._normalize(vector)
+        if snapshot.scales is not None:
+            scores *= snapshot.scales
+        scores = np.where(mask, scores, -np.inf)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return {
+            'matches': [
+                {
+                    'id': manifest['ids'][row],
+                    'score': float(scores[row]),
+                    'metadata': manifest['metadata'][row] if include_metadata else {},
+                }
+                for row in top
+            ]
+        }
+
+    def list_ids(self, page_size=100):
+        ids = [vector_id for vector_id in self._current().manifest['ids'] if vector_id is not None]
+        for start in range(0, len(ids), page_size):
+            yield ids[start:start + page_size]
+
+    def stats(self):
+        manifest = self._current().manifest
+        return {
+            'dimension': manifest['dimension'],
+            'total_vector_count': manifest['count'] - len(manifest['deleted']),
+            'deleted_vector_count': len(manifest['deleted']),
+            'capacity': manifest['capacity'],
+            'dtype': manifest.get('dtype', 'float32'),
+            'generation': manifest['generation'],
+        }
+
+    # Metadata filters
+
+    def _column(self, snapshot, key):
+        """Metadata values for key as an object array, plus whether any value is a list"""
+        if key not in snapshot.columns:
+            values = [(metadata or {}).get(key) for metadata in snapshot.manifest['metadata']]
+            column = np.empty(len(values), dtype=object)
+            column[:] = values
+            snapshot.columns[key] = (column, any(isinstance(value, list) for value in values))
+        return snapshot.columns[key]
+
+    def _filter_mask(self, snapshot, filter):
+        count = snapshot.manifest['count']
+        mask = np.ones(count, dtype=bool)
+        if not filter:
+            return mask
+
+        for key, condition in filter.items():
+            if key == '$and':
+                for clause in condition:
+                    mask &= self._filter_mask(snapshot, clause)
+            elif key == '$or':
+                any_mask = np.zeros(count, dtype=bool)
+                for clause in condition:
+                    any_mask |= self._filter_mask(snapshot, clause)
+                mask &= any_mask
+            else:
+                if not isinstance(condition, dict):
+                    condition = {'$eq': condition}
+                column, has_lists = self._column(snapshot, key)
+                for operator, operand in condition.items():
+                    mask &= self._match(column, has_lists, operator, operand)
+        return mask
+
+    @staticmethod
+    def _match(column, has_lists, operator, operand):
+        # Scalar columns (the choice fields) compare vectorized; list columns
+        # (tags) match when any element satisfies the condition, as in Pinecone
+        if not has_lists and operator in ('$eq', '$ne', '$in', '$nin'):
+            operands = operand if operator in ('$in', '$nin') else [operand]
+            matches = np.isin(column, list(operands))
+            return ~matches if operator in ('$ne', '$nin') else matches
+
+        def test(value):
+            values = value if isinstance(value, list) else [value]
+            if operator == '$eq':
+                return operand in values
+            if operator == '$ne':
+                return operand not in values
+            if operator == '$in':
+                return any(item in operand for item in values)
+            if operator == '$nin':
+                return not any(item in operand for item in values)
+            if value is None:
+                return False
+            if operator == '$gt':
+                return value > operand
+            if operator == '$gte':
+                return value >= operand
+            if operator == '$lt':
+                return value < operand
+            if operator == '$lte':
+                return value <= operand
+            raise ValueError(f"Unsupported filter operator {operator}")
+
+        return np.fromiter((test(value) for value in column), dtype=bool, count=len(column))
+
+
+BACKENDS = {
+    'pinecone': PineconeBackend,
+    'local': LocalVectorBackend,
+}
+
+
+def create_backend(name=None, **kwargs):
+    """Instantiate the configured vector backend (settings.VECTOR_BACKEND)"""
+    name = name or settings.VECTOR_BACKEND
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown vector backend '{name}'. Choose from: {', '.join(BACKENDS)}")
+    return backend_class(**kwargs)
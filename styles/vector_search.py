@@ -1,35 +1,105 @@
+import asyncio
+import hashlib
+import json
 import os
-from pinecone import Pinecone
-from openai import OpenAI
+import threading
+import httpx
+from asgiref.sync import sync_to_async
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
 from django.conf import settings
 from .models import Style
+from .cache import embedding_cache, normalize_text
+from .vector_backends import create_backend
+
+def embedding_key(dimensions=None):
+    """Embedding model qualified by its output size, for cache keys and content hashes"""
+    dimensions = dimensions or settings.EMBEDDING_DIMENSIONS
+    return f"{settings.EMBEDDING_MODEL}:{dimensions}" if dimensions else settings.EMBEDDING_MODEL
+
+
+def embedding_options(dimensions=None):
+    """Extra embeddings.create arguments; shortened vectors need the dimensions parameter"""
+    dimensions = dimensions or settings.EMBEDDING_DIMENSIONS
+    return {'dimensions': dimensions} if dimensions else {}
+
+
+def get_tag_names(style):
+    """Sorted tag names for a style, served from prefetched tags when available"""
+    # taggit defines no ordering; sort so content hashes are stable between runs
+    return sorted(tag.name for tag in style.tags.all())
+
 
 class VectorSearchService:
     def __init__(self):
-        # Initialize OpenAI
-        self.openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        pool_size = settings.VECTOR_SEARCH_POOL_SIZE
 
-        # Initialize Pinecone using new v3+ API
-        self.pc = Pinecone(api_key=os.getenv('PINECONE_API_KEY'))
-        self.index = self.pc.Index(os.getenv('PINECONE_INDEX_NAME'))
+        # Initialize OpenAI with a persistent keep-alive connection pool
+        self.http_limits = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY,
+        )
+        self.openai_client = OpenAI(
+            api_key=os.getenv('OPENAI_API_KEY'),
+            timeout=settings.OPENAI_TIMEOUT,
+            max_retries=settings.OPENAI_MAX_RETRIES,
+            http_client=DefaultHttpxClient(limits=self.http_limits),
+        )
+        self._async_client = None
+        self._async_loop = None
+
+        # Vector store (Pinecone or the local memory-mapped index)
+        self.backend = create_backend()
+
+    @property
+    def async_openai_client(self):
+        """AsyncOpenAI client for the running event loop; its connection pool is loop-bound"""
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            self._async_client = AsyncOpenAI(
+                api_key=os.getenv('OPENAI_API_KEY'),
+                timeout=settings.OPENAI_TIMEOUT,
+                max_retries=settings.OPENAI_MAX_RETRIES,
+                http_client=DefaultAsyncHttpxClient(limits=self.http_limits),
+            )
+            self._async_loop = loop
+        return self._async_client
 
     def generate_embedding(self, text):
         """Generate embedding for given text using OpenAI"""
-        try:
-            # Create embeddings — text embeddings measure the relatedness of text strings
-            # Convert text to vector numbers
-            response = self.openai_client.embeddings.create(
-                model="text-embedding-3-small",
-                input=text
-            )
-            return response.data[0].embedding
-        except Exception as e:
-            print(f"Error generating embedding: {e}")
-            return None
+        return self.generate_embeddings([text])[0]
+
+    def generate_embeddings(self, texts, dimensions=None):
+        """
+        Generate embeddings for many texts, embedding all cache misses in one
+        request. dimensions defaults to settings.EMBEDDING_DIMENSIONS.
+        """
+        texts = [normalize_text(text) for text in texts]
+        key = embedding_key(dimensions)
+        found = embedding_cache.get_many(key, texts)
+        missing = list(dict.fromkeys(text for text in texts if text not in found))
+
+        if missing:
+            try:
+                # Create embeddings — text embeddings measure the relatedness of text strings
+                # Convert text to vector numbers
+                response = self.openai_client.embeddings.create(
+                    model=settings.EMBEDDING_MODEL,
+                    input=missing,
+                    **embedding_options(dimensions)
+                )
+                items = sorted(response.data, key=lambda item: item.index)
+                generated = {text: item.embedding for text, item in zip(missing, items)}
+                embedding_cache.set_many(key, generated)
+                found.update(generated)
+            except Exception as e:
+                print(f"Error generating embedding: {e}")
+
+        return [found.get(text) for text in texts]
 
     def create_style_text(self, style):
         """Create searchable text from style object"""
-        tags_text = ", ".join(style.tags.names()) if style.tags.exists() else ""
+        tags_text = ", ".join(get_tag_names(style))
 
         text_parts = [
             style.title,
@@ -46,122 +116,203 @@ class VectorSearchService:
 
         return " ".join(filter(None, text_parts))
 
-    def index_style(self, style):
-        """Add or update a style in the vector database"""
-        try:
-            # Create searchable text
-            style_text = self.create_style_text(style)
-
-            # Generate embedding
-            embedding = self.generate_embedding(style_text)
-            if not embedding:
-                return False
-
-            # Prepare metadata
-            metadata = {
-                'style_id': style.id,
-                'title': style.title,
-                'description': style.description or "",
-                'face_shape': style.face_shape,
-                'gender': style.gender,
-                'length': style.length,
-                'texture': style.texture,
-                'thickness': style.thickness,
-                'maintenance': style.maintenance,
-                'stylist_name': style.stylist_name,
-                'tags': list(style.tags.names()) if style.tags.exists() else []
-            }
-
-            # Upsert to Pinecone
-            self.index.upsert([(
-                f"style_{style.id}",
-                embedding,
-                metadata
-            )])
+    def build_metadata(self, style):
+        """Metadata stored alongside each style vector"""
+        return {
+            'style_id': style.id,
+            'title': style.title,
+            'description': style.description or "",
+            'face_shape': style.face_shape,
+            'gender': style.gender,
+            'length': style.length,
+            'texture': style.texture,
+            'thickness': style.thickness,
+            'maintenance': style.maintenance,
+            'stylist_name': style.stylist_name,
+            'tags': get_tag_names(style)
+        }
 
-            return True
+    def content_hash(self, style):
+        """Hash of the embedding model, text and metadata a style is indexed with"""
+        payload = json.dumps(
+            [embedding_key(), self.create_style_text(style), self.build_metadata(style)],
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
-        except Exception as e:
-            print(f"Error indexing style {style.id}: {e}")
-            return False
+    def embed_styles(self, styles):
+        """Embeddings for many styles in one request; None where embedding failed"""
+        return self.generate_embeddings([self.create_style_text(style) for style in styles])
+
+    def index_styles(self, styles, batch_size=100, embeddings=None):
+        """
+        Add or update many styles: one embedding request for the whole chunk
+        (unless embeddings are passed in), then upserts of at most batch_size
+        vectors. Returns the ids of the styles that were indexed. Prefetch tags
+        on the queryset to avoid a query per style.
+        """
+        styles = list(styles)
+        if embeddings is None:
+            embeddings = self.embed_styles(styles)
+
+        vectors = [
+            (f"style_{style.id}", embedding, self.build_metadata(style))
+            for style, embedding in zip(styles, embeddings)
+            if embedding
+        ]
+        return self.upsert_vectors(vectors, batch_size=batch_size)
+
+    def upsert_vectors(self, vectors, batch_size=100, backend=None):
+        """Upsert (id, values, metadata) tuples in batches; returns the style ids written"""
+        backend = backend or self.backend
+        indexed = []
+        for start in range(0, len(vectors), batch_size):
+            batch = vectors[start:start + batch_size]
+            try:
+                backend.upsert(batch)
+                indexed.extend(vector[2]['style_id'] for vector in batch)
+            except Exception as e:
+                print(f"Error upserting {len(batch)} styles: {e}")
+
+        return indexed
 
     def delete_style(self, style):
+        return self.delete_styles([style.id])
+
+    def delete_styles(self, style_ids):
+        """Remove styles from the vector database by id"""
         try:
-            self.index.delete(ids=[f"style_{style.id}"])
+            self.backend.delete([f"style_{style_id}" for style_id in style_ids])
+            return True
         except Exception as e:
-            print(f"Error deleting style {style.id}: {e}")
+            print(f"Error deleting styles {list(style_ids)}: {e}")
             return False
 
-    def search_styles(self, query, top_k=10):
-        """Search for styles based on natural language query"""
+    def search_styles(self, query, top_k=10, filter=None):
+        """
+        Search for styles based on natural language query, optionally
+        restricted by a metadata filter before scoring. Returns None when the
+        embedding or the vector query failed, so callers can tell a failure
+        from an empty result.
+        """
         try:
             # Generate embedding for query
             query_embedding = self.generate_embedding(query)
             if not query_embedding:
-                return []
+                return None
 
-            # Search in Pinecone
-            results = self.index.query(
+            # Search the vector backend
+            results = self.backend.query(
                 vector=query_embedding,
                 top_k=top_k,
+                filter=filter,
                 include_metadata=True
             )
 
-            # Extract style IDs and scores
-            style_results = []
-            print('matches', results)
-            for match in results['matches']:
-                style_id = match['metadata']['style_id']
-                score = match['score']
-                if match['score'] >= 0.75:  # Only include high-confidence matches
-                    style_results.append({
-                    'style_id': style_id,
-                    'score': score,
-                    'metadata': match['metadata']
-                })
-
-            return style_results
+            return self.extract_style_results(results)
 
         except Exception as e:
             print(f"Error searching styles: {e}")
-            return []
+            return None
+
+    def extract_style_results(self, results):
+        """Extract style IDs and scores from a backend query result"""
+        style_results = []
+        for match in results['matches']:
+            style_id = match['metadata']['style_id']
+            score = match['score']
+            if match['score'] >= settings.VECTOR_SEARCH_MIN_SCORE:  # Only include high-confidence matches
+                style_results.append({
+                'style_id': style_id,
+                'score': score,
+                'metadata': match['metadata']
+            })
+
+        return style_results
+
+    async def agenerate_embedding(self, text):
+        """Async generate_embedding using the AsyncOpenAI client"""
+        text = normalize_text(text)
+        key = embedding_key()
+        cached = await sync_to_async(embedding_cache.get)(key, text)
+        if cached is not None:
+            return cached
 
-    def generate_ai_response(self, query, search_results, styles):
-        """Generate AI response about the search results"""
         try:
-            if not search_results:
-                return "Sorry, I couldn't find any hairstyles matching your description. Try describing the look you want in different words."
+            response = await self.async_openai_client.embeddings.create(
+                model=settings.EMBEDDING_MODEL,
+                input=[text],
+                **embedding_options()
+            )
+            embedding = response.data[0].embedding
+            await sync_to_async(embedding_cache.set)(key, text, embedding)
+            return embedding
+        except Exception as e:
+            print(f"Error generating embedding: {e}")
+            return None
 
-            # Create context from the found styles
-            styles_context = []
-            for style in styles[:5]:  # Limit to top 5 for context
-                tags = ", ".join(style.tags.names()) if style.tags.exists() else "No tags"
-                style_info = f"- {style.title} by {style.stylist_name}: {style.description or 'No description'} (Length: {style.get_length_display()}, Texture: {style.get_texture_display()}, Maintenance: {style.get_maintenance_display()}, Tags: {tags})"
-                styles_context.append(style_info)
+    async def asearch_styles(self, query, top_k=10, filter=None, embedding_timeout=None, query_timeout=None):
+        """Async search_styles; each stage is abandoned after its timeout (seconds), returning None"""
+        try:
+            query_embedding = await asyncio.wait_for(self.agenerate_embedding(query), embedding_timeout)
+            if not query_embedding:
+                return None
 
-            context_text = "\n".join(styles_context)
+            results = await asyncio.wait_for(
+                self.backend.aquery(vector=query_embedding, top_k=top_k, filter=filter, include_metadata=True),
+                query_timeout
+            )
 
-            prompt = f"""You are a professional hairstylist helping clients find the perfect hairstyle.
+            return self.extract_style_results(results)
 
-            User's request: "{query}"
+        except Exception as e:
+            print(f"Error searching styles: {e!r}")
+            return None
 
-            Here are the matching hairstyles I found:
-            {context_text}
+    no_results_message = "Sorry, I couldn't find any hairstyles matching your description. Try describing the look you want in different words."
 
-            Please provide a helpful, friendly response that:
-            1. Acknowledges their request and references them as a trend setter, a beauty or something else stylish
-            2. Briefly describes why these styles match what they're looking for
-            3. Highlights 2-3 key styles that would work best
-            4. Gives practical advice about maintenance, styling, or considerations
-            5. Keep it conversational and encouraging
-            6. Return a max of 200 words
-            7. Each paragraph should be a max length of 75 words
+    def fallback_ai_response(self, query, styles):
+        return f"I found {len(styles)} hairstyles that match your request for '{query}'. Check out the results below!"
+
+    def build_ai_prompt(self, query, styles):
+        """Prompt for the AI stylist response"""
+        # Create context from the found styles
+        styles_context = []
+        for style in styles[:5]:  # Limit to top 5 for context
+            tags = ", ".join(get_tag_names(style)) or "No tags"
+            style_info = f"- {style.title} by {style.stylist_name}: {style.description or 'No description'} (Length: {style.get_length_display()}, Texture: {style.get_texture_display()}, Maintenance: {style.get_maintenance_display()}, Tags: {tags})"
+            styles_context.append(style_info)
+
+        context_text = "\n".join(styles_context)
+
+        return f"""You are a professional hairstylist helping clients find the perfect hairstyle.
+
+        User's request: "{query}"
+
+        Here are the matching hairstyles I found:
+        {context_text}
+
+        Please provide a helpful, friendly response that:
+        1. Acknowledges their request and references them as a trend setter, a beauty or something else stylish
+        2. Briefly describes why these styles match what they're looking for
+        3. Highlights 2-3 key styles that would work best
+        4. Gives practical advice about maintenance, styling, or considerations
+        5. Keep it conversational and encouraging
+        6. Return a max of 200 words
+        7. Each paragraph should be a max length of 75 words
+
+        Response should be 1-2 paragraphs maximum."""
+
+    def generate_ai_response(self, query, search_results, styles):
+        """Generate AI response about the search results; None if the OpenAI call failed"""
+        try:
+            if not search_results:
+                return self.no_results_message
 
-            Response should be 1-2 paragraphs maximum."""
             response = self.openai_client.responses.create(
                 model="gpt-4o-mini",
                 instructions="You are a helpful hairstylist assistant.",
-                input=prompt,
+                input=self.build_ai_prompt(query, styles),
                 max_output_tokens=250, # 1 token is approximately 4 characters or 0.75 words for English text.
                 temperature=0.7
             )
@@ -170,5 +321,78 @@ class VectorSearchService:
 
         except Exception as e:
             print(f"Error generating AI response: {e}")
-            return f"I found {len(styles)} hairstyles that match your request for '{query}'. Check out the results below!"
+            return None
+
+    async def agenerate_ai_response(self, query, search_results, styles):
+        """Async generate_ai_response; styles should already be evaluated. None on failure"""
+        try:
+            if not search_results:
+                return self.no_results_message
+
+            prompt = await sync_to_async(self.build_ai_prompt)(query, styles)
+            response = await self.async_openai_client.responses.create(
+                model="gpt-4o-mini",
+                instructions="You are a helpful hairstylist assistant.",
+                input=prompt,
+                max_output_tokens=250,
+                temperature=0.7
+            )
+
+            return response.output[0].content[0].text
+
+        except Exception as e:
+            print(f"Error generating AI response: {e}")
+            return None
+
+    def stream_ai_response(self, query, search_results, styles):
+        """
+        Yield the AI response in text chunks as they arrive from the Responses
+        API. The generator returns False if the stream failed and what was
+        yielded is partial or the fallback text, otherwise True.
+        """
+        if not search_results:
+            yield self.no_results_message
+            return True
+
+        streamed = False
+        try:
+            stream = self.openai_client.responses.create(
+                model="gpt-4o-mini",
+                instructions="You are a helpful hairstylist assistant.",
+                input=self.build_ai_prompt(query, styles),
+                max_output_tokens=250,
+                temperature=0.7,
+                stream=True
+            )
+            for event in stream:
+                if event.type == "response.output_text.delta":
+                    streamed = True
+                    yield event.delta
+            return True
+
+        except Exception as e:
+            print(f"Error streaming AI response: {e}")
+            if not streamed:
+                yield self.fallback_ai_response(query, styles)
+            return False
+
+
+_service = None
+_service_pid = None
+_service_lock = threading.Lock()
+
 
+def get_vector_service():
+    """
+    Process-wide VectorSearchService, built lazily on first use so its HTTP
+    connections are reused across requests. The pid check rebuilds it in a
+    forked child (e.g. gunicorn --preload) instead of sharing the parent's sockets.
+    """
+    global _service, _service_pid
+    pid = os.getpid()
+    if _service is None or _service_pid != pid:
+        with _service_lock:
+            if _service is None or _service_pid != pid:
+                _service = VectorSearchService()
+                _service_pid = pid
+    return _service
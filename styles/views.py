@@ -1,11 +1,108 @@
+import asyncio
+import json
+import mimetypes
+import os
+import re
+import stat
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render
+from django.db import close_old_connections, transaction
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from rest_framework import viewsets
-from .models import Style, Image
+from .models import Style, Image, StyleNeighbors
 from .serializers import StyleSerializer, ImageSerializer
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
-from .vector_search import VectorSearchService
+from .vector_search import get_vector_service
+from .cache import search_cache_key, get_cached_search, cache_search, facets_cache_key, get_cached_facets, cache_facets, catalog_etag
+from .filters import StyleFilterBackend, facet_counts, parse_filters
+from .fragments import render_style_ids, render_styles
+from .pagination import StylePagination
+from .query_parser import parse_query
+from .search_index import lexical_search, reciprocal_rank_fusion
+from .storage import is_hashed_name
+
+
+def _query_error(query):
+    if not query:
+        return 'Query is required'
+
+    if len(query) > 500:
+        return 'Query too long (max 500 characters)'
+
+    return None
+
+
+def _validate_query(request):
+    """Return (query, error_response)"""
+    query = request.data.get('query', '').strip()
+    error = _query_error(query)
+    return query, Response({'error': error}, status=400) if error else None
+
+
+def _hydrate(style_ids):
+    """Style objects for style_ids, in the same (ranked) order"""
+    styles = Style.objects.with_related().in_bulk(style_ids)
+    return [styles[style_id] for style_id in style_ids if style_id in styles]
+
+
+# Threads for the network-bound half of a hybrid search
+_search_executor = ThreadPoolExecutor(
+    max_workers=settings.VECTOR_SEARCH_POOL_SIZE, thread_name_prefix="vector-search"
+)
+
+
+def _vector_results(vector_service, parsed):
+    try:
+        return vector_service.search_styles(parsed.text, top_k=10, filter=parsed.vector_filter())
+    finally:
+        # Pool threads outlive requests; release their database connection like a request would
+        close_old_connections()
+
+
+def _fuse(vector_results, lexical_ids):
+    """Return (fused results, search_method) for the two retrievers' rankings"""
+    search_results = reciprocal_rank_fusion({
+        "vector": [result['style_id'] for result in vector_results],
+        "text": lexical_ids,
+    })
+    if vector_results and lexical_ids:
+        return search_results, "hybrid"
+    return search_results, "vector" if vector_results else "text"
+
+
+def _annotate(results, search_results):
+    """Add the fused score and contributing sources to serialized styles"""
+    ranking = {result['style_id']: result for result in search_results}
+    for result in results:
+        result['score'] = ranking[result['id']]['score']
+        result['sources'] = ranking[result['id']]['sources']
+    return results
+
+
+def _run_search(parsed):
+    """
+    Retrieve styles for a parsed query: returns (styles, search_results,
+    search_method, degraded). Vector and full-text retrieval run concurrently
+    and are fused by rank; degraded is set when vector search failed.
+    """
+    vector_service = get_vector_service()
+    vector_future = _search_executor.submit(_vector_results, vector_service, parsed)
+    lexical_ids = lexical_search(parsed, limit=10)
+    vector_results = vector_future.result()
+    search_results, search_method = _fuse(vector_results or [], lexical_ids)
+    styles = _hydrate([result['style_id'] for result in search_results])
+    return styles, search_results, search_method, vector_results is None
 
 
 @api_view(['POST'])
@@ -14,57 +111,47 @@ def search_styles(request):
     """
     Search styles using natural language query
     """
-    query = request.data.get('query', '').strip()
+    query, error = _validate_query(request)
+    if error:
+        return error
 
-    if not query:
-        return Response({'error': 'Query is required'}, status=400)
-
-    if len(query) > 500:
-        return Response({'error': 'Query too long (max 500 characters)'}, status=400)
+    # Identical queries against an unchanged catalog are served from cache
+    cache_key = search_cache_key(query, request.build_absolute_uri('/'))
+    cached = get_cached_search(cache_key)
+    if cached is not None:
+        response = Response({**cached, 'query': query})
+        response['X-Cache'] = 'HIT'
+        return response
 
     try:
-        # Try vector search first, fall back to text search
-        try:
-            vector_service = VectorSearchService()
-            search_results = vector_service.search_styles(query, top_k=10)
-
-            if search_results:
-                # Get the actual Style objects
-                style_ids = [result['style_id'] for result in search_results]
-                styles = Style.objects.filter(id__in=style_ids)
-                search_method = "vector"
-            else:
-                raise Exception("No vector results")
-
-        except Exception as vector_error:
-            # Fall back to text-based search
-            from django.db.models import Q
-            styles = Style.objects.filter(
-                Q(title__icontains=query) |
-                Q(description__icontains=query) |
-                Q(stylist_name__icontains=query) |
-                Q(tags__name__icontains=query)
-            ).distinct()
-            search_method = "text"
-
-        # Serialize the results
-        serializer = StyleSerializer(styles, many=True, context={'request': request})
+        parsed = parse_query(query)
+        styles, search_results, search_method, degraded = _run_search(parsed)
+
+        # Serialize the results from the per-style fragment cache
+        results = render_styles(styles, request)
 
         # Generate AI response about the results
-        if search_method == "vector":
-            ai_response = vector_service.generate_ai_response(query, search_results, styles)
-        else:
-            # For text search, create a simple VectorSearchService instance for AI response
-            vector_service = VectorSearchService()
-            ai_response = vector_service.generate_ai_response(query, [], styles)
+        vector_service = get_vector_service()
+        ai_response = vector_service.generate_ai_response(query, search_results, styles)
+        if ai_response is None:
+            ai_response = vector_service.fallback_ai_response(query, styles)
+            degraded = True
 
-        return Response({
+        payload = {
             'query': query,
-            'results': serializer.data,
+            'results': _annotate(results, search_results),
             'search_method': search_method,
+            'filters': parsed.filters,
             'ai_response': ai_response,
             'message': f'Found {len(styles)} matching styles using {search_method} search'
-        })
+        }
+        # A result degraded by an upstream failure is not kept once it recovers
+        if not degraded:
+            cache_search(cache_key, payload)
+
+        response = Response(payload)
+        response['X-Cache'] = 'MISS'
+        return response
 
     except Exception as e:
         return Response({
@@ -72,40 +159,413 @@ def search_styles(request):
         }, status=500)
 
 
-class FavoritesViewSet(viewsets.ReadOnlyModelViewSet):
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def search_styles_stream(request):
+    """
+    Search styles and stream the response as server-sent events: a `results`
+    event as soon as styles are found, `token` events with the AI stylist
+    response as it is generated, then a `done` event with timings (ms).
+    """
+    query, error = _validate_query(request)
+    if error:
+        return error
+
+    started = time.monotonic()
+    cache_key = search_cache_key(query, request.build_absolute_uri('/'))
+    cached = get_cached_search(cache_key)
+
+    def elapsed_ms():
+        return round((time.monotonic() - started) * 1000, 1)
+
+    def events():
+        timing = {}
+        try:
+            if cached is not None:
+                payload = {**cached, 'query': query}
+                tokens = [cached['ai_response']]
+                degraded = False
+            else:
+                parsed = parse_query(query)
+                styles, search_results, search_method, degraded = _run_search(parsed)
+                payload = {
+                    'query': query,
+                    'results': _annotate(render_styles(styles, request), search_results),
+                    'search_method': search_method,
+                    'filters': parsed.filters,
+                    'message': f'Found {len(styles)} matching styles using {search_method} search'
+                }
+                tokens = get_vector_service().stream_ai_response(query, search_results, styles)
+
+            yield _sse('results', {k: v for k, v in payload.items() if k != 'ai_response'})
+            timing['results_ms'] = elapsed_ms()
+
+            ai_response = []
+            tokens = iter(tokens)
+            while True:
+                try:
+                    token = next(tokens)
+                except StopIteration as stop:
+                    # stream_ai_response returns False when the stream broke off
+                    complete = stop.value is not False
+                    break
+                if not ai_response:
+                    timing['first_token_ms'] = elapsed_ms()
+                ai_response.append(token)
+                yield _sse('token', {'text': token})
+
+            if cached is None and complete and not degraded:
+                cache_search(cache_key, {**payload, 'ai_response': "".join(ai_response)})
+
+            timing['total_ms'] = elapsed_ms()
+            yield _sse('done', {'cache': 'HIT' if cached is not None else 'MISS', 'timing': timing})
+
+        except Exception as e:
+            yield _sse('error', {'error': f'Search failed: {str(e)}'})
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Tell nginx not to buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _serialize_styles(style_ids, request):
+    styles = _hydrate(style_ids)
+    return styles, render_styles(styles, request)
+
+
+async def search_styles_async(request):
+    """
+    Async variant of search_styles for ASGI deployments. The full-text query
+    runs while the query embedding is in flight, and every stage is bounded
+    by settings.SEARCH_DEADLINES (seconds).
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+
+    query = str(data.get('query', '')).strip()
+    error = _query_error(query)
+    if error:
+        return JsonResponse({'error': error}, status=400)
+
+    cache_key = await sync_to_async(search_cache_key)(query, request.build_absolute_uri('/'))
+    cached = await sync_to_async(get_cached_search)(cache_key)
+    if cached is not None:
+        response = JsonResponse({**cached, 'query': query})
+        response['X-Cache'] = 'HIT'
+        return response
+
+    deadlines = settings.SEARCH_DEADLINES
+    lexical = None
+    try:
+        vector_service = await sync_to_async(get_vector_service, thread_sensitive=False)()
+
+        # Run full-text retrieval concurrently with the vector search
+        parsed = parse_query(query)
+        lexical = asyncio.ensure_future(
+            asyncio.wait_for(_lexical_ids(parsed), deadlines['lexical'])
+        )
+        vector_results = await vector_service.asearch_styles(
+            query,
+            top_k=10,
+            filter=parsed.vector_filter(),
+            embedding_timeout=deadlines['embedding'],
+            query_timeout=deadlines['vector'],
+        )
+        degraded = vector_results is None
+        try:
+            lexical_ids = await lexical
+        except asyncio.TimeoutError:
+            lexical_ids = []
+            degraded = True
+
+        search_results, search_method = _fuse(vector_results or [], lexical_ids)
+        styles, results = await sync_to_async(_serialize_styles)(
+            [result['style_id'] for result in search_results], request
+        )
+        _annotate(results, search_results)
+
+        try:
+            ai_response = await asyncio.wait_for(
+                vector_service.agenerate_ai_response(query, search_results, styles),
+                deadlines['ai']
+            )
+        except asyncio.TimeoutError:
+            ai_response = None
+        if ai_response is None:
+            ai_response = vector_service.fallback_ai_response(query, styles)
+            degraded = True
+
+        payload = {
+            'query': query,
+            'results': results,
+            'search_method': search_method,
+            'filters': parsed.filters,
+            'ai_response': ai_response,
+            'message': f'Found {len(styles)} matching styles using {search_method} search'
+        }
+        if not degraded:
+            await sync_to_async(cache_search)(cache_key, payload)
+
+        response = JsonResponse(payload)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    except Exception as e:
+        if lexical:
+            lexical.cancel()
+        return JsonResponse({
+            'error': f'Search failed: {str(e)}'
+        }, status=500)
+
+
+# Django < 5.0 decorators do not preserve async views; mark it directly
+search_styles_async.csrf_exempt = True
+
+
+async def _lexical_ids(parsed):
+    return await sync_to_async(lexical_search)(parsed, limit=10)
+
+
+def _conditional_get(request, respond):
+    """
+    Answer If-None-Match with 304 when the catalog is unchanged, before any
+    style is queried or serialized; otherwise return respond() with the ETag.
+    """
+    # Photo URLs are absolute, so the host is part of the representation
+    etag = catalog_etag(request.get_host(), request.get_full_path())
+    if etag is None:
+        return respond()
+    response = get_conditional_response(request, etag=etag) or respond()
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        # Let browsers keep the payload but revalidate it on every use
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+class CatalogETagMixin:
+    """Conditional GET for list and retrieve, keyed by the catalog version"""
+
+    def list(self, request, *args, **kwargs):
+        return _conditional_get(request, lambda: super(CatalogETagMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return _conditional_get(request, lambda: super(CatalogETagMixin, self).retrieve(request, *args, **kwargs))
+
+
+class FavoritesViewSet(CatalogETagMixin, viewsets.ReadOnlyModelViewSet):
     """
     Favorited items
     """
-    queryset = Style.objects.all()
+    queryset = Style.objects.with_related()
     serializer_class = StyleSerializer
     permission_classes = [AllowAny]
 
-    def get_queryset(self):
+    def get_ids(self):
         ids_param = self.request.query_params.get('ids', '')
-        if not ids_param:
-            return Style.objects.none()
-
         try:
-            # Parse comma-separated IDs
-            ids = [int(id.strip()) for id in ids_param.split(',') if id.strip()]
-            return Style.objects.filter(id__in=ids)
+            # Parse comma-separated IDs, dropping repeats
+            return list(dict.fromkeys(int(id.strip()) for id in ids_param.split(',') if id.strip()))
         except ValueError:
+            return []
+
+    def get_queryset(self):
+        ids = self.get_ids()
+        if not ids:
             return Style.objects.none()
+        return Style.objects.with_related().filter(id__in=ids)
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
+        return _conditional_get(request, lambda: self.render_favorites(request))
+
+    def render_favorites(self, request):
+        # Served from the per-style fragment cache, in the order the ids were given
+        results = render_style_ids(self.get_ids(), request)
 
         return Response({
-            'count': queryset.count(),
-            'results': serializer.data,
+            'count': len(results),
+            'results': results,
         })
 
 
-class StyleViewSet(viewsets.ModelViewSet):
+class StyleViewSet(CatalogETagMixin, viewsets.ModelViewSet):
     """
-    Generic viewset for each Style
+    Generic viewset for each Style. The list accepts the filter params of
+    styles.filters, e.g. ?texture=curly&tags=blonde, and ?pagination=cursor.
     """
 
-    queryset = Style.objects.all()
+    queryset = Style.objects.with_related().order_by("created_at", "id")
     serializer_class = StyleSerializer
+    filter_backends = [StyleFilterBackend]
+    pagination_class = StylePagination
+
+    # Keep the style write and its queued index operation in one transaction
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            super().perform_create(serializer)
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            super().perform_update(serializer)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            super().perform_destroy(instance)
+
+    @action(detail=False)
+    def facets(self, request):
+        """
+        Style counts per choice field value and tag, restricted by filter
+        params such as ?length=short,medium&tags=blonde&stylist=Sam.
+        Cached per catalog version.
+        """
+        filters = parse_filters(request.query_params)
+        cache_key = facets_cache_key(filters)
+        payload = get_cached_facets(cache_key)
+        if payload is None:
+            payload = facet_counts(filters)
+            cache_facets(cache_key, payload)
+            cache_status = 'MISS'
+        else:
+            cache_status = 'HIT'
+
+        response = Response(payload)
+        response['X-Cache'] = cache_status
+        return response
+
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        """
+        Styles most similar to this one, nearest first, from the lists
+        precomputed by `manage.py compute_neighbors`
+        """
+        try:
+            neighbors = StyleNeighbors.objects.filter(style_id=int(pk)).first()
+        except ValueError:
+            raise Http404
+        if neighbors is None:
+            if not Style.objects.filter(pk=pk).exists():
+                raise Http404
+            return Response({'count': 0, 'results': []})
+
+        scores = dict(zip(neighbors.neighbor_ids, neighbors.scores))
+        styles = _hydrate(neighbors.neighbor_ids)
+        results = self.get_serializer(styles, many=True).data
+        for result in results:
+            result['score'] = scores[result['id']]
+
+        return Response({
+            'count': len(styles),
+            'results': results,
+        })
+
+
+# Content-hashed media never changes; older uploads may be replaced in place
+MEDIA_IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+MEDIA_MAX_AGE = 60 * 60
+MEDIA_CHUNK_SIZE = 64 * 1024
+BYTE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _byte_range(request, size, etag, last_modified):
+    """
+    (start, end) of a single-range request, or None to send the whole file
+    (no Range header, several ranges, or an If-Range that no longer matches).
+    Raises ValueError if the range is unsatisfiable.
+    """
+    match = BYTE_RANGE.match(request.META.get('HTTP_RANGE', '').strip())
+    if not match or not any(match.groups()):
+        return None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range not in (etag, http_date(last_modified)):
+        return None
+    first, last = match.groups()
+    if first:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    else:
+        start, end = max(0, size - int(last)), size - 1
+    if start > end or start >= size:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(MEDIA_CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def _stream_media(request, full_path, file_stat, content_type):
+    last_modified = int(file_stat.st_mtime)
+    etag = f'"{file_stat.st_size:x}-{file_stat.st_mtime_ns:x}"'
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        try:
+            byte_range = _byte_range(request, file_stat.st_size, etag, last_modified)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f"bytes */{file_stat.st_size}"
+            return response
+        if byte_range is None:
+            response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _read_range(full_path, start, end - start + 1), status=206, content_type=content_type
+            )
+            response['Content-Length'] = end - start + 1
+            response['Content-Range'] = f"bytes {start}-{end}/{file_stat.st_size}"
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def serve_media(request, path):
+    """
+    Serve a file under MEDIA_ROOT as configured by MEDIA_SERVE_MODE: hand it
+    to nginx (X-Accel-Redirect) or Apache/lighttpd (X-Sendfile), or stream it
+    with Range, ETag and Last-Modified support. Content-hashed names are
+    marked immutable for a year.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        file_stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404
+    if not stat.S_ISREG(file_stat.st_mode):
+        raise Http404
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    if settings.MEDIA_SERVE_MODE == 'x-accel':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.MEDIA_INTERNAL_URL + quote(path)
+    elif settings.MEDIA_SERVE_MODE == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+    else:
+        response = _stream_media(request, full_path, file_stat, content_type)
+
+    if is_hashed_name(path):
+        patch_cache_control(response, public=True, max_age=MEDIA_IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=MEDIA_MAX_AGE)
+    return response